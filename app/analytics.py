@@ -0,0 +1,214 @@
+"""
+Vectorised analytics over the habit log.
+
+The log is turned into dense arrays in one pass:
+- daily:    hours per calendar day from the first logged day to `end`
+- per_task: a (tasks x days) matrix of the same
+
+and every metric (streaks, rolling averages, weekday profile, per-task
+trends) is computed with NumPy operations on those arrays, so the cost
+after loading does not depend on the number of log entries.
+NumPy is imported on first use, not at module load.
+"""
+from datetime import date, timedelta
+
+
+def _np():
+    import numpy as np
+    return np
+
+
+def _ordinal(day):
+    """"YYYY-MM-DD..." or date -> proleptic ordinal, None if unparsable."""
+    if isinstance(day, date):
+        return day.toordinal()
+    try:
+        return date.fromisoformat(str(day)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+class HabitMatrix:
+    """Dense per-day arrays for a date range [start, start + days)."""
+
+    def __init__(self, start, daily, tasks, per_task):
+        self.start = start            # date of index 0
+        self.daily = daily            # float64[days]
+        self.tasks = tasks            # task names, row order of per_task
+        self.per_task = per_task      # float32[tasks, days]
+
+    @property
+    def days(self):
+        return len(self.daily)
+
+    def index_of(self, day):
+        return day.toordinal() - self.start.toordinal()
+
+    def dates(self):
+        return [self.start + timedelta(days=i) for i in range(self.days)]
+
+
+def from_columns(day_ordinals, task_ids, hours, task_names, end=None):
+    """
+    Builds a HabitMatrix from parallel arrays (ordinal, task id, hours).
+    task_ids index task_names; -1 means no task. `end` (a date) extends
+    the range to that day so trailing idle days count.
+    """
+    np = _np()
+    day_ordinals = np.asarray(day_ordinals, dtype=np.int64)
+    task_ids = np.asarray(task_ids, dtype=np.int64)
+    hours = np.asarray(hours, dtype=np.float64)
+
+    end_ord = end.toordinal() if end else None
+    if day_ordinals.size == 0:
+        start = end or date.today()
+        days = 1
+        first = start.toordinal()
+    else:
+        first = int(day_ordinals.min())
+        last = max(int(day_ordinals.max()), end_ord or 0)
+        start = date.fromordinal(first)
+        days = last - first + 1
+
+    offsets = day_ordinals - first
+    daily = np.bincount(offsets, weights=hours, minlength=days)[:days]
+
+    n_tasks = len(task_names)
+    has_task = task_ids >= 0
+    flat = task_ids[has_task] * days + offsets[has_task]
+    per_task = np.bincount(flat, weights=hours[has_task], minlength=n_tasks * days)
+    per_task = per_task[:n_tasks * days].reshape(n_tasks, days).astype(np.float32)
+
+    return HabitMatrix(start, daily, list(task_names), per_task)
+
+
+def build(entries, end=None):
+    """One pass over log entries ({"date", "task", "hours"}) -> HabitMatrix."""
+    from array import array
+
+    ordinals = array("q")
+    task_ids = array("q")
+    hours = array("d")
+    encoding = {}
+
+    for log in entries:
+        day = _ordinal(log.get("date"))
+        if day is None:
+            continue
+        task = log.get("task")
+        ordinals.append(day)
+        task_ids.append(encoding.setdefault(task, len(encoding)) if task else -1)
+        hours.append(float(log.get("hours", 0) or 0))
+
+    return from_columns(ordinals, task_ids, hours, list(encoding), end=end)
+
+
+def from_daily_hours(daily_hours, end=None):
+    """HabitMatrix (no task rows) from the sidecar's {date: hours} map."""
+    days = [(_ordinal(d), h) for d, h in daily_hours.items()]
+    days = [(o, h) for o, h in days if o is not None]
+    return from_columns([o for o, _ in days], [-1] * len(days), [h for _, h in days], [], end=end)
+
+
+def extend_to(matrix, day):
+    """Same matrix padded with idle days up to and including `day`."""
+    np = _np()
+    extra = matrix.index_of(day) + 1 - matrix.days
+    if extra <= 0:
+        return matrix
+    return HabitMatrix(
+        matrix.start,
+        np.concatenate((matrix.daily, np.zeros(extra))),
+        matrix.tasks,
+        np.pad(matrix.per_task, ((0, 0), (0, extra)))
+    )
+
+
+# ------------------------------------------------------------
+# METRICS
+# ------------------------------------------------------------
+def _runs(active):
+    """(starts, ends) of runs of True, ends exclusive."""
+    np = _np()
+    edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def longest_streak(matrix):
+    starts, ends = _runs(matrix.daily > 0)
+    return int((ends - starts).max()) if starts.size else 0
+
+
+def current_streak(matrix, today=None):
+    """
+    Consecutive studied days ending today. A streak that ended yesterday
+    is still current (today is not over yet).
+    """
+    np = _np()
+    today = today or date.today()
+    last = matrix.index_of(today)
+    if last < 0:
+        return 0
+    active = np.zeros(last + 1, dtype=bool)
+    span = min(last + 1, matrix.days)
+    active[:span] = matrix.daily[:span] > 0
+
+    if not active[last]:
+        last -= 1
+        if last < 0 or not active[last]:
+            return 0
+    idle = np.flatnonzero(~active[:last + 1])
+    return int(last - idle[-1]) if idle.size else last + 1
+
+
+def rolling_mean(matrix, window):
+    """Average hours/day over the trailing `window` days, for every day."""
+    np = _np()
+    sums = np.concatenate(([0.0], np.cumsum(matrix.daily)))
+    idx = np.arange(1, matrix.days + 1)
+    return (sums[idx] - sums[np.maximum(idx - window, 0)]) / window
+
+
+def weekday_profile(matrix):
+    """Average hours per weekday, Monday first."""
+    np = _np()
+    weekdays = (np.arange(matrix.days) + matrix.start.weekday()) % 7
+    totals = np.bincount(weekdays, weights=matrix.daily, minlength=7)
+    counts = np.bincount(weekdays, minlength=7)
+    return np.divide(totals, counts, out=np.zeros(7), where=counts > 0)
+
+
+def task_trends(matrix, window=28):
+    """
+    Per-task least-squares slope of daily hours over the last `window`
+    days, in hours/day per day. Returns {task: slope}.
+    """
+    np = _np()
+    recent = matrix.per_task[:, -window:].astype(np.float64)
+    if recent.shape[1] < 2:
+        return {t: 0.0 for t in matrix.tasks}
+    x = np.arange(recent.shape[1], dtype=np.float64)
+    x -= x.mean()
+    slopes = recent @ x / (x @ x)
+    return {t: float(s) for t, s in zip(matrix.tasks, slopes)}
+
+
+def summarise(matrix, today=None):
+    """Every metric as a plain dict; rolling averages end on `today`."""
+    np = _np()
+    today = today or date.today()
+    matrix = extend_to(matrix, today)
+    weekday = weekday_profile(matrix)
+    at = matrix.index_of(today)
+    names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    return {
+        "total_hours": round(float(matrix.daily.sum()), 4),
+        "active_days": int(np.count_nonzero(matrix.daily)),
+        "current_streak": current_streak(matrix, today),
+        "longest_streak": longest_streak(matrix),
+        "avg_7d": round(float(rolling_mean(matrix, 7)[at]), 2),
+        "avg_28d": round(float(rolling_mean(matrix, 28)[at]), 2),
+        "weekday_profile": {n: round(float(h), 2) for n, h in zip(names, weekday)},
+        "task_hours": {t: round(float(h), 4) for t, h in zip(matrix.tasks, matrix.per_task.sum(axis=1))},
+        "task_trends": {t: round(s, 4) for t, s in task_trends(matrix).items()},
+    }
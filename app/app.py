@@ -1,69 +1,64 @@
 
 
 
-import gradio as gr
+from datetime import date, timedelta
+import logging
 import os
 from backend import (
-    generate_study_plan,
-    generate_quote,
+    stream_study_plan,
+    generate_study_plan_structured,
+    STUDY_PLAN_MODE,
+    next_quote,
+    quote_pool,
     save_study_plan,
     generate_quick_insights,
     get_next_task,
     load_habit_data,
     log_study_session,
-    calculate_total_hours,
-    calculate_streak,
+    load_habit_stats,
+    habit_kpis,
+    habit_hours_between,
     generate_weekly_summary,
     complete_current_task
 )
 from calendar_module import calendar_tab
-import matplotlib.pyplot as plt
-from backend import get_study_hours_by_task
+from charts import render_donut_chart
+from user_state import BROWSER_ID_HEAD, per_user
+import metrics
+import profiling
 
-def render_donut_chart():
-    data = get_study_hours_by_task()
+logger = logging.getLogger(__name__)
 
-    fig, ax = plt.subplots(figsize=(4, 4))
 
-    if not data:
-        ax.text(0.5, 0.5, "No study data yet",
-                ha="center", va="center", fontsize=12)
-        ax.axis("off")
-        return fig
-
-    labels = list(data.keys())
-    values = list(data.values())
-
-    ax.pie(
-        values,
-        labels=labels,
-        autopct="%1.0f%%",
-        startangle=90,
-        wedgeprops=dict(width=0.4)
-    )
-
-    ax.set_title("Study Time Breakdown")
-
-    return fig
+def _handler(name, fn):
+    """Latency metrics and on-demand profiling for an inline event handler."""
+    return metrics.instrument(name, kind="handler")(profiling.profiled(name)(fn))
 
 
 
 
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def load_dashboard():
-        logs = load_habit_data()
-
-        # ---- KPIs ----
-        total_hours = calculate_total_hours(logs) if logs else 0
-        streak = calculate_streak(logs) if logs else 0
+        # ---- KPIs (one read of the habit aggregate sidecar, shared with the donut) ----
+        stats = load_habit_stats()
+        total_hours, streak, best_streak = habit_kpis(stats)
+        today = date.today()
+        week_hours = habit_hours_between(today - timedelta(days=today.weekday()), today)
 
         
-        quote = generate_quote()
-        quote_html = f"<div class='quote-bubble'>Stay consistent</div>"
-        hours_html = f"<div class='kpi-box'>Hours Studied<br><b>{total_hours}</b></div>"
-        streak_html = f"<div class='kpi-box'>Study Streak<br><b>{streak} days</b></div>"
+        quote_html = f"<div class='quote-bubble'>{next_quote()}</div>"
+        hours_html = (
+            f"<div class='kpi-box'>Hours Studied<br><b>{total_hours}</b>"
+            f"<br><small>This week: {week_hours}h</small></div>"
+        )
+        streak_html = (
+            f"<div class='kpi-box'>Study Streak<br><b>{streak} days</b>"
+            f"<br><small>Best: {best_streak} days</small></div>"
+        )
 
         next_task = get_next_task()
-        donut = render_donut_chart()
+        donut = render_donut_chart(data=stats["task_hours"])
         if next_task:
             task_html = (
                 f"<div class='next-task'>"
@@ -101,245 +96,284 @@ def switch_theme(choice):
 
 
 
-with gr.Blocks() as demo:
-    css_box = gr.HTML(f"<style>{dark_css}</style>")
+def build_demo():
+    """Builds the Gradio UI. gradio is imported here, not at module load."""
+    import gradio as gr
 
-    theme_state = gr.State("Dark")
-    with gr.Tabs():
-        
- 
-        # -----------------------------------------
-        # HOME TAB
-        # -----------------------------------------
-        with gr.Tab("Home"):
-
-            # Header
-            gr.Markdown("<div class='sense-header'> SenseFlow Dashboard</div>")
-
-            # Quote bubble
-            quote_box = gr.Markdown("<div class='quote-bubble'> Quote loading...</div>")
-            
-           
-            theme_toggle = gr.Radio(
-            ["Dark", "Light"],
-            value="Dark",
-            label="Theme",
-            elem_classes="theme-toggle"
-        )
-            
-          
+    with gr.Blocks(head=BROWSER_ID_HEAD) as demo:
+        css_box = gr.HTML(f"<style>{dark_css}</style>")
 
+        theme_state = gr.State("Dark")
+        with gr.Tabs():
 
-            # KPI + Donut layout
-            with gr.Row():
 
-                # LEFT SIDE KPIs
-                with gr.Column(scale=1):
-                    kpi_hours = gr.Markdown("<div class='kpi-box'>Hours Studied: --</div>")
-                    kpi_streak = gr.Markdown("<div class='kpi-box'>Study Streak: --</div>")
+            # -----------------------------------------
+            # HOME TAB
+            # -----------------------------------------
+            with gr.Tab("Home"):
 
-                # RIGHT SIDE DONUT
-                with gr.Column(scale=2):
-                    gr.Markdown(
-                        "<div style='color:white; font-size:20px; margin-bottom:10px;'>Progress Donut</div>"
-                    )
-                    donut_plot = gr.Plot(label="Study Breakdown")
+                # Header
+                gr.Markdown("<div class='sense-header'> SenseFlow Dashboard</div>")
+
+                # Quote bubble
+                quote_box = gr.Markdown("<div class='quote-bubble'> Quote loading...</div>")
 
 
-            # NEXT TASK BOX
-            next_task_box = gr.Markdown(
-                "<div class='next-task'>📌 Your next task is...<br>(Will be populated from study plan)</div>"
+                theme_toggle = gr.Radio(
+                ["Dark", "Light"],
+                value="Dark",
+                label="Theme",
+                elem_classes="theme-toggle"
             )
 
-            # NAVIGATION BUTTONS
-            gr.Markdown("<div style='color:white; font-size:20px; margin-top:25px;'>Navigation</div>")
 
-            with gr.Row():
-                planner_btn = gr.Button("📘 Generate Study Plan", elem_classes="nav-btn")
-                calendar_btn = gr.Button("📅 Calendar ", elem_classes="nav-btn")
-                tracker_btn = gr.Button("📝 Log Studies", elem_classes="nav-btn")
-                complete_task_btn = gr.Button("✅ Complete Task")
-                complete_task_btn.click(
-                    fn=complete_current_task,
-                    inputs=None,
-                    outputs=next_task_box
+
+
+                # KPI + Donut layout
+                with gr.Row():
+
+                    # LEFT SIDE KPIs
+                    with gr.Column(scale=1):
+                        kpi_hours = gr.Markdown("<div class='kpi-box'>Hours Studied: --</div>")
+                        kpi_streak = gr.Markdown("<div class='kpi-box'>Study Streak: --</div>")
+
+                    # RIGHT SIDE DONUT
+                    with gr.Column(scale=2):
+                        gr.Markdown(
+                            "<div style='color:white; font-size:20px; margin-bottom:10px;'>Progress Donut</div>"
+                        )
+                        donut_plot = gr.HTML(label="Study Breakdown")
+
+
+                # NEXT TASK BOX
+                next_task_box = gr.Markdown(
+                    "<div class='next-task'>📌 Your next task is...<br>(Will be populated from study plan)</div>"
                 )
 
+                # NAVIGATION BUTTONS
+                gr.Markdown("<div style='color:white; font-size:20px; margin-top:25px;'>Navigation</div>")
+
+                with gr.Row():
+                    planner_btn = gr.Button("📘 Generate Study Plan", elem_classes="nav-btn")
+                    calendar_btn = gr.Button("📅 Calendar ", elem_classes="nav-btn")
+                    tracker_btn = gr.Button("📝 Log Studies", elem_classes="nav-btn")
+                    complete_task_btn = gr.Button("✅ Complete Task")
+                    complete_task_btn.click(
+                        fn=per_user(_handler("complete_current_task", complete_current_task)),
+                        inputs=None,
+                        outputs=next_task_box
+                    )
 
-                refresh_dashboard_btn = gr.Button("🔄 Refresh Dashboard", elem_classes="nav-btn")
-                refresh_dashboard_btn.click(
-                fn=load_dashboard,
-                inputs=None,
-                outputs=[quote_box, kpi_hours, kpi_streak, next_task_box,donut_plot]
-            )
 
-                quote_btn = gr.Button("🔄 Refresh Quote", elem_classes="nav-btn")
-                quote_btn.click(
-                fn=lambda: f"<div class='quote-bubble'>{generate_quote()}</div>",
-                inputs=None,
-                outputs=quote_box
-)
-       
-        
-        # -----------------------------------------
-        # OTHER TABS (unchanged)
-        # -----------------------------------------
-        with gr.Tab("Study Planner"):
+                    refresh_dashboard_btn = gr.Button("🔄 Refresh Dashboard", elem_classes="nav-btn")
+                    refresh_dashboard_btn.click(
+                    fn=per_user(load_dashboard),
+                    inputs=None,
+                    outputs=[quote_box, kpi_hours, kpi_streak, next_task_box,donut_plot]
+                )
 
-            gr.Markdown("## STUDY PLANNER")
+                    quote_btn = gr.Button("🔄 Refresh Quote", elem_classes="nav-btn")
+                    quote_btn.click(
+                    fn=_handler(
+                        "refresh_quote",
+                        lambda: f"<div class='quote-bubble'>{next_quote()}</div>"
+                    ),
+                    inputs=None,
+                    outputs=quote_box
+    )
 
-            # ---- Add Task UI ----
-            new_task = gr.Textbox(label="Add a Task")
-            add_task_btn = gr.Button("➕ Add Task", elem_classes="nav-btn")
 
-            # This holds the tasks internally
-            task_list_state = gr.State([])
+            # -----------------------------------------
+            # OTHER TABS (unchanged)
+            # -----------------------------------------
+            with gr.Tab("Study Planner"):
 
-            # Where tasks will be shown on screen
-            task_list_display = gr.Markdown("<div class='task-list'>No tasks added yet.</div>")
+                gr.Markdown("## STUDY PLANNER")
 
-            # ---- Function to update tasks ----
-            def add_task(task, task_list):
-                if not task.strip():
-                    return task_list, "<div class='task-list'>Enter a task first.</div>", ""
+                # ---- Add Task UI ----
+                new_task = gr.Textbox(label="Add a Task")
+                add_task_btn = gr.Button("➕ Add Task", elem_classes="nav-btn")
 
-                new_list = (task_list or []) + [task.strip()]
+                # This holds the tasks internally
+                task_list_state = gr.State([])
 
-                html = "<div class='task-list'><ul>"
-                for t in new_list:
-                    html += f"<li>{t}</li>"
-                html += "</ul></div>"
+                # Where tasks will be shown on screen
+                task_list_display = gr.Markdown("<div class='task-list'>No tasks added yet.</div>")
 
-                return new_list, html, ""
+                # ---- Function to update tasks ----
+                def add_task(task, task_list):
+                    if not task.strip():
+                        return task_list, "<div class='task-list'>Enter a task first.</div>", ""
 
-            add_task_btn.click(
-                fn=add_task,
-                inputs=[new_task, task_list_state],
-                outputs=[task_list_state, task_list_display,new_task]
-            )
+                    new_list = (task_list or []) + [task.strip()]
 
-            # ---- Study plan options ----
-            time_input = gr.Slider(1, 8, label="Available Hours")
-            difficulty = gr.Dropdown(["Easy", "Medium", "Hard"])
-            style = gr.Dropdown(["Pomodoro", "Deep Work", "Short Sessions"])
-             # ---- Deadline Input Section ----
-            gr.Markdown("### ADD A DEADLINE")
-
-
-            deadline_name = gr.Textbox(label="Deadline Name (e.g., Maths Exam)")
-            deadline_date = gr.Textbox(label="Deadline Date (YYYY-MM-DD HH:MM)")
-
-           
-
-            generate_btn = gr.Button("Generate Plan", elem_classes="nav-btn")
-            plan_output = gr.Markdown()
-
-            # Function to combine tasks for the LLM (later)
-            def prepare_plan(task_list, hours, diff, style, deadline_name, deadline_date):
-                print("DEBUG prepare_plan called")
-                print("tasks:", task_list)
-                print("hours:", hours)
-                print("difficulty:", diff)
-                print("style:", style)
-                print("deadline_name:", deadline_name)
-                print("deadline_date:", deadline_date)
-                if not task_list:
-                    return "Add at least 1 task before generating a plan."
-
-                tasks_joined = "\n".join(task_list)
-
-                try:
-                    plan = generate_study_plan(tasks_joined, hours, diff, style)
-                except Exception as e:
-                    print("LLM ERROR:", e)
-                    return "AI plan generation failed."
-
-                save_study_plan(
-                    plan_text=plan,
-                    tasks=task_list,
-                    hours=hours,
-                    study_style=style,
-                    deadline={
-                        "name": deadline_name or "Deadline",
-                        "date": deadline_date
-                    }
-                )
+                    html = "<div class='task-list'><ul>"
+                    for t in new_list:
+                        html += f"<li>{t}</li>"
+                    html += "</ul></div>"
+
+                    return new_list, html, ""
 
-                return plan
-            generate_btn.click(
-                    fn=prepare_plan,
-                    inputs=[
-                        task_list_state,
-                        time_input,
-                        difficulty,
-                        style,
-                        deadline_name,
-                        deadline_date
-                    ],
-                    outputs=plan_output
+                add_task_btn.click(
+                    fn=_handler("add_plan_task", add_task),
+                    inputs=[new_task, task_list_state],
+                    outputs=[task_list_state, task_list_display,new_task]
                 )
 
+                # ---- Study plan options ----
+                time_input = gr.Slider(1, 8, label="Available Hours")
+                difficulty = gr.Dropdown(["Easy", "Medium", "Hard"])
+                style = gr.Dropdown(["Pomodoro", "Deep Work", "Short Sessions"])
+                 # ---- Deadline Input Section ----
+                gr.Markdown("### ADD A DEADLINE")
+
 
+                deadline_name = gr.Textbox(label="Deadline Name (e.g., Maths Exam)")
+                deadline_date = gr.Textbox(label="Deadline Date (YYYY-MM-DD HH:MM)")
 
-        with gr.Tab("Habit Tracker"):
-            hours_input = gr.Slider(0, 6, label="Hours Studied")
-            task_input = gr.Textbox(
-        label="Task Studied",
-        placeholder="e.g. maths"
+
+
+                generate_btn = gr.Button("Generate Plan", elem_classes="nav-btn")
+                plan_output = gr.Markdown()
+
+                # Streams the plan into plan_output, then saves the final text
+                @metrics.instrument(kind="handler")
+                @profiling.profiled()
+                def prepare_plan(task_list, hours, diff, style, deadline_name, deadline_date):
+                    logger.debug(
+                        "prepare_plan: tasks=%s hours=%s difficulty=%s style=%s deadline=%s %s",
+                        task_list, hours, diff, style, deadline_name, deadline_date
+                    )
+                    if not task_list:
+                        yield "Add at least 1 task before generating a plan."
+                        return
+
+                    tasks_joined = "\n".join(task_list)
+
+                    plan = ""
+                    sessions = None
+                    try:
+                        if STUDY_PLAN_MODE == "json":
+                            plan, sessions = generate_study_plan_structured(
+                                tasks_joined, hours, diff, style
+                            )
+                            yield plan
+                        else:
+                            for plan in stream_study_plan(tasks_joined, hours, diff, style):
+                                yield plan
+                    except Exception as e:
+                        logger.exception("Plan generation failed: %s", e)
+                        yield "AI plan generation failed."
+                        return
+
+                    save_study_plan(
+                        plan_text=plan,
+                        tasks=task_list,
+                        hours=hours,
+                        study_style=style,
+                        deadline={
+                            "name": deadline_name or "Deadline",
+                            "date": deadline_date
+                        },
+                        structured_sessions=sessions
+                    )
+                generate_btn.click(
+                        fn=per_user(prepare_plan),
+                        inputs=[
+                            task_list_state,
+                            time_input,
+                            difficulty,
+                            style,
+                            deadline_name,
+                            deadline_date
+                        ],
+                        outputs=plan_output
+                    )
+
+
+
+            with gr.Tab("Habit Tracker"):
+                hours_input = gr.Slider(0, 6, label="Hours Studied")
+                task_input = gr.Textbox(
+            label="Task Studied",
+            placeholder="e.g. maths"
+        )
+
+                log_btn = gr.Button("Log Session")
+                log_output = gr.Markdown()
+                log_btn.click(
+                fn=per_user(_handler("log_study_session", log_study_session)),
+                inputs=[hours_input, task_input],
+                outputs=log_output
     )
 
-            log_btn = gr.Button("Log Session")
-            log_output = gr.Markdown()
-            log_btn.click(
-            fn=log_study_session,
-            inputs=[hours_input, task_input],
-            outputs=log_output
-)
 
-        
-        with gr.Tab("Calendar"):
-            calendar_tab()
-           
-            
+            with gr.Tab("Calendar"):
+                calendar_tab()
 
 
 
-        with gr.Tab("Motivation"):
 
-            # ---- Page Title ----
-            gr.Markdown("<div class='motivation-title'>STUDY MOTIVATION</div>")
 
-            # ---- Quote Placeholder ----
-            motivation_quote = gr.Markdown(
-                "<div class='motivation-quote'>Your motivational quote will appear here...</div>"
-            )
+            with gr.Tab("Motivation"):
+
+                # ---- Page Title ----
+                gr.Markdown("<div class='motivation-title'>STUDY MOTIVATION</div>")
 
-            refresh_quote_btn = gr.Button("🔄 Refresh Quote", elem_classes="nav-btn")
+                # ---- Quote Placeholder ----
+                motivation_quote = gr.Markdown(
+                    "<div class='motivation-quote'>Your motivational quote will appear here...</div>"
+                )
+
+                refresh_quote_btn = gr.Button("🔄 Refresh Quote", elem_classes="nav-btn")
+                refresh_quote_btn.click(
+                    fn=_handler(
+                        "refresh_motivation_quote",
+                        lambda: f"<div class='motivation-quote'>{next_quote()}</div>"
+                    ),
+                    inputs=None,
+                    outputs=motivation_quote
+                )
 
-            gr.Markdown("<hr style='border:1px solid #444; margin-top:20px;'>")
+                gr.Markdown("<hr style='border:1px solid #444; margin-top:20px;'>")
+
+
+
+                # ---- Deadline List Placeholder ----
+                deadlines_list = gr.Markdown(
+                    "<div class='deadline-list'>Your deadlines will appear here...</div>"
+                )
 
-           
 
-            # ---- Deadline List Placeholder ----
-            deadlines_list = gr.Markdown(
-                "<div class='deadline-list'>Your deadlines will appear here...</div>"
+
+        theme_toggle.change(
+                fn=_handler("switch_theme", switch_theme),
+                inputs=theme_toggle,
+                outputs=css_box,
             )
 
-            
-    
-    theme_toggle.change(
-            fn=switch_theme,
-            inputs=theme_toggle,
-            outputs=css_box,
-        )
-    
-    
-    demo.load(
-    fn=load_dashboard,
-    inputs=None,
-    outputs=[quote_box, kpi_hours, kpi_streak, next_task_box]
-)
 
+        demo.load(
+        fn=per_user(load_dashboard),
+        inputs=None,
+        outputs=[quote_box, kpi_hours, kpi_streak, next_task_box, donut_plot]
+    )
+
+    return demo
+
+
+def main():
+    # SENSEFLOW_LOG_LEVEL=DEBUG brings back the old debug output
+    logging.basicConfig(level=os.getenv("SENSEFLOW_LOG_LEVEL", "WARNING").upper())
+    # Prometheus text at http://127.0.0.1:<SENSEFLOW_METRICS_PORT>/metrics
+    metrics.start_server()
+    # kill -USR1 <pid> profiles the next handler calls (see profiling.py)
+    profiling.install_signal_handler()
+    # Fetch the first batch of quotes while the server starts
+    quote_pool.refill_async()
+    demo = build_demo()
+    demo.launch()
 
 
-demo.launch()
+if __name__ == "__main__":
+    main()
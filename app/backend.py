@@ -1,52 +1,397 @@
 import os
-from dotenv import load_dotenv
-load_dotenv()
-from openai import OpenAI
 from prompts import STUDY_PLAN_PROMPT
+from prompts import STUDY_PLAN_JSON_PROMPT
 from prompts import QUOTE_PROMPT
+from prompts import QUOTE_BATCH_PROMPT
 from prompts import NEXT_TASK_EXTRACTION_PROMPT
 from prompts import QUICK_INSIGHTS_PROMPT
 from prompts import WEEKLY_SUMMARY_PROMPT
-from collections import defaultdict
-from datetime import datetime
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime
 import json
 import re
+import atexit
+import logging
+import time
+from contextlib import contextmanager
+from concurrent.futures import TimeoutError as FuturesTimeout
+import threading
+import llm_cache
+import llm_pool
+import llm_resilience
+import metrics
+import storage_sqlite
+from file_locks import locked
+from user_state import current_user
+from llm_client import get_client, MODEL
+import habit_summary
+import analytics
+import habit_columnar
+from habit_index import LogIndex
+from quote_pool import QuotePool
+
+logger = logging.getLogger(__name__)
+
+# "markdown" (default) or "json": structured sessions, markdown rendered locally
+STUDY_PLAN_MODE = os.getenv("STUDY_PLAN_MODE", "markdown")
+
+
+def _fallback_reply(endpoint, key, fallback, error):
+    """
+    Used when the API call failed: a stale cached reply if there is one,
+    otherwise the caller's local fallback, otherwise LLMUnavailable.
+    """
+    logger.warning("LLM %s unavailable (%s: %s), using fallback",
+                   endpoint, type(error).__name__, error)
+    stale = llm_cache.get(endpoint, key, allow_stale=True)
+    if stale is not None:
+        return stale
+    if fallback is not None:
+        return fallback()
+    raise llm_resilience.LLMUnavailable(f"{endpoint}: {error}") from error
+
+
+def _chat(endpoint, prompt, use_cache=True, fallback=None, **options):
+    """
+    Sends one user prompt and returns the reply text.
+    Identical requests are answered from llm_cache while fresh;
+    use_cache=False skips the lookup but still stores the new reply.
+    Extra options (e.g. response_format) are passed to the API.
+    Calls run on the endpoint's bounded pool; identical concurrent
+    requests share one upstream call. Deadlines, retries, hedging and
+    the circuit breaker come from llm_resilience; when they give up,
+    fallback() (if given) supplies a locally built reply.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    caching = llm_cache.ttl_for(endpoint) > 0 and not llm_cache.cache_bypassed()
+    key = llm_cache.make_key(MODEL, messages, options)
+
+    if caching and use_cache:
+        cached = llm_cache.get(endpoint, key)
+        if cached is not None:
+            return cached
+
+    def attempt(timeout):
+        result = get_client().complete(MODEL, messages, timeout=timeout, **options)
+        metrics.record_llm(endpoint, result.usage)
+        return result.text
+
+    def call():
+        try:
+            content = llm_resilience.call(endpoint, attempt)
+        except Exception as e:
+            return _fallback_reply(endpoint, key, fallback, e)
+        if caching:
+            llm_cache.put(endpoint, key, content)
+        return content
+
+    # Queue wait counts too: give up after the deadline plus one attempt
+    policy = llm_resilience.policy_for(endpoint)
+    try:
+        return llm_pool.run(endpoint, key, call,
+                            timeout=policy["deadline"] + policy["attempt_timeout"])
+    except FuturesTimeout as e:
+        return _fallback_reply(endpoint, key, fallback, e)
+
+
+def _chat_stream(endpoint, prompt, use_cache=True, fallback=None):
+    """
+    Streaming variant of _chat: yields the reply text received so far
+    each time new tokens arrive. A cache hit is yielded once, whole.
+    Waiting for a stream slot is bounded by the attempt timeout, and the
+    stream by the endpoint's deadline; failures before the first token
+    are retried (llm_resilience.stream), then fall back like _chat. Once
+    text has been shown the error is raised instead.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    caching = llm_cache.ttl_for(endpoint) > 0 and not llm_cache.cache_bypassed()
+    key = llm_cache.make_key(MODEL, messages)
+
+    if caching and use_cache:
+        cached = llm_cache.get(endpoint, key)
+        if cached is not None:
+            yield cached
+            return
+
+    def open_stream(timeout):
+        # Every attempt counts as a request; tokens once the usage arrives
+        usage = {}
+        try:
+            usage = yield from get_client().stream(MODEL, messages, timeout=timeout)
+        finally:
+            metrics.record_llm(endpoint, usage)
+
+    policy = llm_resilience.policy_for(endpoint)
+    text = ""
+    breaker = None
+    try:
+        with llm_pool.stream_slot(endpoint, timeout=policy["attempt_timeout"]):
+            breaker = llm_resilience.stream_guard(endpoint)
+            for delta in llm_resilience.stream(endpoint, open_stream):
+                text += delta
+                yield text
+    except GeneratorExit:
+        # The reader stopped early; the upstream was answering fine
+        breaker.record_success()
+        raise
+    except Exception as e:
+        # No breaker yet: no free slot, or the circuit is open
+        if breaker is not None:
+            breaker.record_failure()
+        if text:
+            raise
+        yield _fallback_reply(endpoint, key, fallback, e)
+        return
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    breaker.record_success()
+    if caching:
+        llm_cache.put(endpoint, key, text)
 
 
-def generate_study_plan(tasks, hours, difficulty, style):
-    
-    prompt = STUDY_PLAN_PROMPT.format(
+def _study_plan_prompt(tasks, hours, difficulty, style):
+    return STUDY_PLAN_PROMPT.format(
         tasks=tasks,
         hours=hours,
         difficulty=difficulty,
         study_style=style
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
+
+def _local_study_plan(tasks, hours, style):
+    """Round-robin plan built without the LLM, used when it is unavailable."""
+    names = [t.strip() for t in re.split(r"[,\n]", str(tasks)) if t.strip()] or ["Study"]
+    sessions = [
+        {
+            "task": names[i % len(names)],
+            "focus": f"{style or 'Focused'} work on {names[i % len(names)]}",
+            "notes": "Offline plan: the AI planner was unavailable."
+        }
+        for i in range(max(int(hours or 1), 1))
+    ]
+    return render_plan_markdown(sessions)
+
+
+@metrics.instrument()
+def generate_study_plan(tasks, hours, difficulty, style, use_cache=True, offline_fallback=True):
+    """
+    offline_fallback=False raises LLMUnavailable instead of returning the
+    locally built plan (batch runs, which retry failed rows later).
+    """
+    prompt = _study_plan_prompt(tasks, hours, difficulty, style)
+    fallback = (lambda: _local_study_plan(tasks, hours, style)) if offline_fallback else None
+    return _chat("plan", prompt, use_cache=use_cache, fallback=fallback)
+
+
+@metrics.instrument()
+def stream_study_plan(tasks, hours, difficulty, style, use_cache=True):
+    """Yields the partial plan markdown as it is generated."""
+    prompt = _study_plan_prompt(tasks, hours, difficulty, style)
+    yield from _chat_stream("plan", prompt, use_cache=use_cache,
+                            fallback=lambda: _local_study_plan(tasks, hours, style))
+
+
+# ------------------------------------------------------------
+# STRUCTURED (JSON) STUDY PLANS
+# ------------------------------------------------------------
+PLAN_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sessions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "task": {"type": "string"},
+                    "focus": {"type": "string"},
+                    "notes": {"type": "string"}
+                },
+                "required": ["task", "focus", "notes"],
+                "additionalProperties": False
+            }
+        },
+        "motivation": {"type": "string"}
+    },
+    "required": ["sessions", "motivation"],
+    "additionalProperties": False
+}
+
+
+def validate_plan_data(data, hours):
+    """
+    Checks a parsed JSON plan against PLAN_JSON_SCHEMA.
+    Returns the first `hours` sessions (extra ones are dropped, so the
+    rendered plan matches what is saved) or raises ValueError.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("sessions"), list):
+        raise ValueError("plan must be an object with a sessions list")
+    if not isinstance(data.get("motivation", ""), str):
+        raise ValueError("motivation must be a string")
+
+    sessions = data["sessions"]
+    if not sessions:
+        raise ValueError("plan has no sessions")
+    if len(sessions) < int(hours):
+        raise ValueError(f"expected {int(hours)} sessions, got {len(sessions)}")
+
+    for s in sessions:
+        if not isinstance(s, dict):
+            raise ValueError("session must be an object")
+        for field in ("task", "focus", "notes"):
+            if not isinstance(s.get(field), str) or not s[field].strip():
+                raise ValueError(f"session field '{field}' must be a non-empty string")
+
+    return sessions[:int(hours)]
+
+
+def render_plan_markdown(sessions, motivation=""):
+    """Renders structured sessions into the plan markdown shown in the UI."""
+    parts = ["## Your Study Plan\n"]
+    for i, s in enumerate(sessions, start=1):
+        parts.append(
+            f"### Study Hour {i}: {s['task']}\n"
+            f"- **Duration:** 1 hour\n"
+            f"- **Focus:** {s['focus']}\n"
+            f"- **Notes:** {s['notes']}\n\n"
+            f"---\n"
+        )
+    if motivation:
+        parts.append(f"**Motivational message:** {motivation}\n")
+    return "\n".join(parts)
+
+
+@metrics.instrument()
+def generate_study_plan_structured(tasks, hours, difficulty, style, use_cache=True,
+                                   offline_fallback=True):
+    """
+    Asks for JSON sessions and renders the markdown locally.
+    Returns (plan_markdown, sessions). If the reply fails validation,
+    falls back to the markdown prompt and returns (plan_text, None).
+    """
+    prompt = STUDY_PLAN_JSON_PROMPT.format(
+        tasks=tasks,
+        hours=hours,
+        difficulty=difficulty,
+        study_style=style
     )
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {"name": "study_plan", "schema": PLAN_JSON_SCHEMA, "strict": True}
+    }
 
-    return response.choices[0].message.content
+    try:
+        text = _chat("plan", prompt, use_cache=use_cache, response_format=response_format)
+        data = json.loads(text)
+        sessions = validate_plan_data(data, hours)
+    except (ValueError, llm_resilience.LLMUnavailable) as e:
+        logger.warning("Structured plan invalid, falling back to markdown: %s", e)
+        plan = generate_study_plan(tasks, hours, difficulty, style, use_cache=use_cache,
+                                   offline_fallback=offline_fallback)
+        return plan, None
+
+    return render_plan_markdown(sessions, data.get("motivation", "")), sessions
 
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PLAN_PATH = os.path.join(BASE_DIR, "current_plan.json")
 
-HABIT_LOG_PATH = os.path.join(BASE_DIR, "habit_log.json")
+# Habit log is append-only JSON Lines: one entry per line.
+HABIT_LOG_PATH = os.path.join(BASE_DIR, "habit_log.jsonl")
+# Old format (a single JSON array), migrated on first access.
+LEGACY_HABIT_LOG_PATH = os.path.join(BASE_DIR, "habit_log.json")
+# Aggregates over the habit log, updated on every append.
+HABIT_STATS_PATH = os.path.join(BASE_DIR, "habit_stats.json")
+
+# "json" (default) or "sqlite": same API, stored in DB_PATH (see storage_sqlite.py)
+STORAGE = os.getenv("SENSEFLOW_STORAGE", "json")
+DB_PATH = os.getenv("SENSEFLOW_DB", os.path.join(BASE_DIR, "senseflow.db"))
+_db_init_lock = threading.Lock()
+
+# Per-user state lives in DATA_DIR/users/<user>/ (see user_state.py).
+# Outside a user scope the single-user paths above are used.
+DATA_DIR = os.getenv("SENSEFLOW_DATA_DIR", BASE_DIR)
+_created_dirs = set()
+
+
+def user_path(filename, default):
+    user = current_user()
+    if user is None:
+        return default
+
+    user_dir = os.path.join(DATA_DIR, "users", user)
+    if user_dir not in _created_dirs:
+        os.makedirs(user_dir, exist_ok=True)
+        _created_dirs.add(user_dir)
+    return os.path.join(user_dir, filename)
+
+
+def plan_path():
+    return user_path("current_plan.json", PLAN_PATH)
+
+
+def habit_log_path():
+    return user_path("habit_log.jsonl", HABIT_LOG_PATH)
+
+
+def legacy_habit_log_path():
+    return user_path("habit_log.json", LEGACY_HABIT_LOG_PATH)
+
+
+def habit_stats_path():
+    return user_path("habit_stats.json", HABIT_STATS_PATH)
+
 
+def habit_columns_path():
+    return user_path("habit_columns", os.path.join(BASE_DIR, "habit_columns"))
 
-def save_study_plan(plan_text, tasks, hours, study_style, deadline=None):
+
+def db_path():
+    return user_path("senseflow.db", DB_PATH)
+
+
+def _db():
+    """SQLite connection; a new database is seeded from the JSON files."""
+    path = db_path()
+    if not os.path.exists(path):
+        # Other worker processes may be seeding the same database
+        with _db_init_lock, locked(path):
+            if not os.path.exists(path):
+                storage_sqlite.migrate_from_json(
+                    path, plan_path(), [habit_log_path(), legacy_habit_log_path()]
+                )
+    return storage_sqlite.connect(path)
+
+
+def write_json_atomic(path, data, indent=None):
+    """Writes to a temp file, fsyncs it, then renames over path."""
+    start = time.perf_counter()
+    payload = json.dumps(data, indent=indent).encode("utf-8")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    metrics.record_io(path, "write", len(payload), time.perf_counter() - start)
+
+
+@metrics.instrument()
+def save_study_plan(plan_text, tasks, hours, study_style, deadline=None,
+                    structured_sessions=None):
     """
     Saves:
     - Full plan text (for display)
     - Structured sessions (for calendar)
+
+    structured_sessions (from generate_study_plan_structured) replaces
+    the markdown parsing of focus and notes.
     """
-    focus_blocks = extract_focus_blocks(plan_text)
-    notes_lines = extract_notes_lines(plan_text)
+    if structured_sessions:
+        focus_blocks = [s["focus"] for s in structured_sessions]
+        notes_lines = [s["notes"] for s in structured_sessions]
+    else:
+        focus_blocks = extract_focus_blocks(plan_text)
+        notes_lines = extract_notes_lines(plan_text)
 
     sessions = []
     session_id = 1
@@ -54,7 +399,10 @@ def save_study_plan(plan_text, tasks, hours, study_style, deadline=None):
     # Repeat tasks to fill available hours
     task_index = 0
     while len(sessions) < hours:
-        task_name = tasks[task_index % len(tasks)]
+        if structured_sessions and task_index < len(structured_sessions):
+            task_name = structured_sessions[task_index]["task"]
+        else:
+            task_name = tasks[task_index % len(tasks)]
 
         focus_text = (
             focus_blocks[session_id - 1]
@@ -79,7 +427,7 @@ def save_study_plan(plan_text, tasks, hours, study_style, deadline=None):
         session_id += 1
         task_index += 1
 
-    print("DEBUG saving sessions:", sessions)
+    logger.debug("Saving %d sessions", len(sessions))
     deadlines = []
 
     if deadline and deadline.get("date"):
@@ -87,18 +435,14 @@ def save_study_plan(plan_text, tasks, hours, study_style, deadline=None):
         "name": deadline.get("name", "Deadline"),
         "date": deadline["date"]
     })
-    with open(PLAN_PATH, "w") as f:
-        json.dump(
-    {
-        "plan": plan_text,
-        "sessions": sessions,
-        "deadlines": deadlines,
-        "completed_sessions": [],
-        "next_session": sessions[0]["session_id"] if sessions else None
-    },
-    f,
-    indent=2
-)
+    with plan_transaction():
+        _write_plan({
+            "plan": plan_text,
+            "sessions": sessions,
+            "deadlines": deadlines,
+            "completed_sessions": [],
+            "next_session": sessions[0]["session_id"] if sessions else None
+        })
 
 
 
@@ -194,15 +538,191 @@ def extract_notes_lines(plan_text):
 
 
 
+# ------------------------------------------------------------
+# STUDY PLAN CACHE
+# ------------------------------------------------------------
+# path -> ((mtime_ns, size, inode) of the file, parsed plan)
+_plan_cache = {}
+_plan_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _read_plan_file(path=None):
+    if STORAGE == "sqlite":
+        return storage_sqlite.load_plan(_db())
+    path = path or plan_path()
+    if not os.path.exists(path):
+        return None
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        raw = f.read()
+    metrics.record_io(path, "read", len(raw), time.perf_counter() - start)
+    return json.loads(raw)
+
+
+def _write_plan(plan, path=None):
+    # Callers hold plan_transaction() for the whole read-modify-write
+    if STORAGE == "sqlite":
+        storage_sqlite.save_plan(_db(), plan)
+        return
+    path = path or plan_path()
+    write_json_atomic(path, plan, indent=2)
+    _plan_cache.pop(path, None)
+
+
+@metrics.instrument()
 def load_study_plan():
-    if not os.path.exists(PLAN_PATH):
+    """
+    Returns the saved plan, re-parsing current_plan.json only when its
+    mtime, size or inode has changed, so writes from other worker
+    processes are picked up too. The dict is shared between callers:
+    treat it as read-only (writers use _read_plan_file).
+    """
+    if STORAGE == "sqlite":
+        return _read_plan_file()
+
+    path = plan_path()
+    pending = _pending_plans.get(path)
+    if pending is not None:
+        _plan_cache_stats["hits"] += 1
+        return pending["plan"]
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
         return None
-    with open(PLAN_PATH, "r") as f:
-        return json.load(f)
 
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached_key, cached_plan = _plan_cache.get(path, (None, None))
+    if cached_key == key:
+        _plan_cache_stats["hits"] += 1
+        return cached_plan
+
+    _plan_cache_stats["misses"] += 1
+    plan = _read_plan_file()
+    _plan_cache[path] = (key, plan)
+    return plan
+
+
+def invalidate_plan_cache():
+    _plan_cache.pop(plan_path(), None)
+
+
+def get_plan_cache_stats():
+    return dict(_plan_cache_stats)
+
+
+def reset_plan_cache_stats():
+    _plan_cache_stats["hits"] = 0
+    _plan_cache_stats["misses"] = 0
+
+
+
+
+# ------------------------------------------------------------
+# PLAN TRANSACTIONS (atomic, coalesced writes)
+# ------------------------------------------------------------
+# Mutations within this many seconds are merged into one write; 0 disables.
+PLAN_WRITE_WINDOW = float(os.getenv("SENSEFLOW_PLAN_WRITE_WINDOW", "0.2"))
+
+# path -> {"plan": in-process view, "mutators": [...] not yet on disk}
+_pending_plans = {}
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _path_lock(path):
+    with _path_locks_guard:
+        lock = _path_locks.get(path)
+        if lock is None:
+            lock = _path_locks[path] = threading.RLock()
+        return lock
+
+
+def _flush_pending_locked(path):
+    """
+    Replays queued mutators on a fresh read of the file and writes once.
+    Caller holds _path_lock(path) and locked(path).
+    """
+    pending = _pending_plans.pop(path, None)
+    if not pending:
+        return
+    plan = _read_plan_file(path)
+    if plan is None:
+        return
+    for mutator in pending["mutators"]:
+        mutator(plan)
+    _write_plan(plan, path)
+
+
+def _flush_pending_plan(path):
+    with _path_lock(path):
+        with locked(path):
+            _flush_pending_locked(path)
+
+
+def flush_pending_plans():
+    for path in list(_pending_plans):
+        _flush_pending_plan(path)
+
+
+atexit.register(flush_pending_plans)
 
 
+@contextmanager
+def plan_transaction():
+    """
+    Holds the in-process and cross-process locks on the current user's
+    plan, after flushing any coalesced writes still pending for it.
+    """
+    path = plan_path()
+    with _path_lock(path):
+        with locked(path):
+            _flush_pending_locked(path)
+            yield path
+
 
+@metrics.instrument()
+def update_plan(mutator, coalesce=True):
+    """
+    Runs mutator(plan) -> (result, changed) as one transaction and
+    returns result. mutator gets None when there is no plan.
+
+    With coalesce, the change is visible in-process immediately and
+    written within PLAN_WRITE_WINDOW seconds; every mutation queued in
+    that window is replayed on a fresh read and saved in one atomic write,
+    so changes from other processes are not lost. Mutators must therefore
+    depend only on the plan they are given.
+    """
+    path = plan_path()
+    if not coalesce or PLAN_WRITE_WINDOW <= 0 or STORAGE == "sqlite":
+        with plan_transaction():
+            plan = _read_plan_file(path)
+            result, changed = mutator(plan)
+            if plan is not None and changed:
+                _write_plan(plan, path)
+            return result
+
+    with _path_lock(path):
+        pending = _pending_plans.get(path)
+        if pending is None:
+            with locked(path):
+                plan = _read_plan_file(path)
+            if plan is None:
+                return mutator(None)[0]
+            pending = {"plan": plan, "mutators": []}
+
+        result, changed = mutator(pending["plan"])
+        if changed:
+            pending["mutators"].append(mutator)
+            if path not in _pending_plans:
+                _pending_plans[path] = pending
+                timer = threading.Timer(PLAN_WRITE_WINDOW, _flush_pending_plan, args=(path,))
+                timer.daemon = True
+                timer.start()
+        return result
+
+
+@metrics.instrument()
 def get_next_task():
     plan = load_study_plan()
     if not plan:
@@ -220,30 +740,261 @@ def get_next_task():
 
 
 
+def migrate_legacy_habit_log():
+    """
+    One-time migration from habit_log.json (JSON array) to habit_log.jsonl.
+    The old file is kept as habit_log.json.bak. Runs under the log's
+    lock, so concurrent first readers (threads or workers) migrate once.
+    """
+    log_path = habit_log_path()
+    legacy_path = legacy_habit_log_path()
+    if os.path.exists(log_path) or not os.path.exists(legacy_path):
+        return
+
+    with locked(log_path):
+        # Another reader may have migrated while we waited for the lock
+        if os.path.exists(log_path) or not os.path.exists(legacy_path):
+            return
+
+        with open(legacy_path, "r") as f:
+            entries = json.load(f)
+
+        tmp_path = f"{log_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, log_path)
+        os.replace(legacy_path, legacy_path + ".bak")
+
+
+def iter_habit_data():
+    """
+    Streams habit log entries one line at a time.
+    A torn last line (crash mid-append) is skipped.
+    """
+    if STORAGE == "sqlite":
+        yield from storage_sqlite.iter_habits(_db())
+        return
+
+    migrate_legacy_habit_log()
+    log_path = habit_log_path()
+    if not os.path.exists(log_path):
+        return
+
+    # Time is measured while the file is open, including the reader's work
+    start = time.perf_counter()
+    nbytes = 0
+    try:
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                nbytes += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    finally:
+        metrics.record_io(log_path, "read", nbytes, time.perf_counter() - start)
+
+
 def load_habit_data():
-    if not os.path.exists(HABIT_LOG_PATH):
-        return []
-    with open(HABIT_LOG_PATH, "r") as f:
-        return json.load(f)
+    return list(iter_habit_data())
+
+
+# ------------------------------------------------------------
+# DATE-RANGE QUERIES (habit_index.py)
+# ------------------------------------------------------------
+# Each index keeps ~60 bytes per log entry (see habit_index.py)
+MAX_HABIT_INDEXES = int(os.getenv("SENSEFLOW_HABIT_INDEXES", "8"))
 
+# habit log path -> LogIndex, least recently used first
+_habit_indexes = OrderedDict()
+_habit_indexes_lock = threading.Lock()
 
+
+def _iso_day(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)[:10]
+
+
+def _habit_index():
+    migrate_legacy_habit_log()
+    path = habit_log_path()
+    with _habit_indexes_lock:
+        index = _habit_indexes.get(path)
+        if index is None:
+            index = _habit_indexes[path] = LogIndex(path)
+        _habit_indexes.move_to_end(path)
+        while len(_habit_indexes) > MAX_HABIT_INDEXES:
+            _habit_indexes.popitem(last=False)
+    return index
+
+
+@metrics.instrument()
+def habits_between(start, end, task=None):
+    """
+    Habit entries with start <= date <= end (dates or ISO strings),
+    in date order, optionally for one task. Served from a date-sorted
+    index that only reads log lines appended since the last query.
+    """
+    if STORAGE == "sqlite":
+        return list(storage_sqlite.habits_between(_db(), _iso_day(start), _iso_day(end), task))
+    return _habit_index().between(start, end, task)
+
+
+@metrics.instrument()
+def habit_hours_between(start, end, task=None):
+    """Total hours logged in the range, without materialising the entries."""
+    if STORAGE == "sqlite":
+        if task is not None:
+            return storage_sqlite.task_hours_between(_db(), task, _iso_day(start), _iso_day(end))
+        return round(sum(log.get("hours", 0) or 0 for log in habits_between(start, end)), 4)
+    return _habit_index().hours_between(start, end, task)
+
+
+@metrics.instrument()
+def task_hours_between(start, end):
+    """{task: hours} for the range."""
+    if STORAGE == "sqlite":
+        totals = defaultdict(float)
+        for log in habits_between(start, end):
+            if log.get("task"):
+                totals[log["task"]] += log.get("hours", 0) or 0
+        return {task: round(hours, 4) for task, hours in totals.items()}
+    return _habit_index().task_hours_between(start, end)
+
+
+@metrics.instrument()
 def save_habit_data(log):
-    data = load_habit_data()
-    data.append(log)
-    with open(HABIT_LOG_PATH, "w") as f:
-        json.dump(data, f, indent=2)
-def complete_next_session():
-    plan = load_study_plan()
-    if not plan:
+    """
+    Appends one entry to the habit log and fsyncs it.
+    Cost is O(1) in the size of the existing log.
+    """
+    if STORAGE == "sqlite":
+        storage_sqlite.append_habit(_db(), log)
         return
 
+    log_path = habit_log_path()
+    line = (json.dumps(log) + "\n").encode("utf-8")
+
+    # One lock covers the append and the sidecar update, so concurrent
+    # writers (threads or processes) cannot lose each other's totals
+    with locked(log_path):
+        migrate_legacy_habit_log()
+        stats = load_habit_stats()
+
+        start = time.perf_counter()
+        with open(log_path, "ab") as f:
+            # If a previous append was torn, start on a fresh line
+            if f.tell() > 0:
+                with open(log_path, "rb") as check:
+                    check.seek(-1, os.SEEK_END)
+                    if check.read(1) != b"\n":
+                        line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        metrics.record_io(log_path, "append", len(line), time.perf_counter() - start)
+
+        _add_to_habit_stats(stats, log)
+        stats["log_size"] = os.path.getsize(log_path)
+        write_json_atomic(habit_stats_path(), stats)
+
+
+# ------------------------------------------------------------
+# HABIT LOG AGGREGATES (habit_stats.json)
+# ------------------------------------------------------------
+def _empty_habit_stats():
+    return {
+        "log_size": 0,  # size of habit_log.jsonl these stats reflect
+        "total_hours": 0,
+        "task_hours": {},
+        "daily_hours": {}
+    }
+
+
+def _add_to_habit_stats(stats, log):
+    hours = log.get("hours", 0) or 0
+    stats["total_hours"] = round(stats["total_hours"] + hours, 4)
+
+    task = log.get("task")
+    if task:
+        task_hours = stats["task_hours"]
+        task_hours[task] = round(task_hours.get(task, 0) + hours, 4)
+
+    day = log.get("date")
+    if day:
+        daily_hours = stats["daily_hours"]
+        daily_hours[day] = round(daily_hours.get(day, 0) + hours, 4)
+
+
+@metrics.instrument()
+def rebuild_habit_stats():
+    """
+    Recomputes habit_stats.json with a full scan of the habit log.
+    """
+    if STORAGE == "sqlite":
+        return storage_sqlite.habit_stats(_db())
+
+    log_path = habit_log_path()
+    with locked(log_path):
+        stats = _empty_habit_stats()
+        for log in iter_habit_data():
+            _add_to_habit_stats(stats, log)
+
+        if os.path.exists(log_path):
+            stats["log_size"] = os.path.getsize(log_path)
+        write_json_atomic(habit_stats_path(), stats)
+    return stats
+
+
+@metrics.instrument()
+def load_habit_stats():
+    """
+    Returns per-task hours, total hours and hours per date.
+    Rebuilds from the raw log when the sidecar is missing or stale
+    (the log changed size without the sidecar being updated).
+    """
+    if STORAGE == "sqlite":
+        return storage_sqlite.habit_stats(_db())
+
+    migrate_legacy_habit_log()
+    log_path = habit_log_path()
+    log_size = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+
+    stats_path = habit_stats_path()
+    try:
+        start = time.perf_counter()
+        with open(stats_path, "rb") as f:
+            raw = f.read()
+        metrics.record_io(stats_path, "read", len(raw), time.perf_counter() - start)
+        stats = json.loads(raw)
+    except (OSError, ValueError):
+        return rebuild_habit_stats()
+
+    if stats.get("log_size") != log_size:
+        return rebuild_habit_stats()
+
+    return stats
+
+
+def _complete_next_session(plan):
+    if not plan:
+        return None, False
+
     sessions = plan.get("sessions", [])
     completed = plan.get("completed_sessions", [])
 
+    done = None
     for s in sessions:
         sid = s["session_id"]
         if sid not in completed:
             completed.append(sid)
+            done = sid
             break
 
     plan["completed_sessions"] = completed
@@ -251,10 +1002,13 @@ def complete_next_session():
         (s["session_id"] for s in sessions if s["session_id"] not in completed),
         None
     )
+    return done, done is not None
+
 
-    with open(PLAN_PATH, "w") as f:
-        json.dump(plan, f, indent=2)
+def complete_next_session():
+    return update_plan(_complete_next_session)
 
+@metrics.instrument()
 def log_study_session(hours, task):
     log = {
         "date": datetime.now().strftime("%Y-%m-%d"),
@@ -262,82 +1016,166 @@ def log_study_session(hours, task):
         "hours": hours
         
     }
-    save_habit_data(log)
+    # Log and completion happen under the same plan lock, so a concurrent
+    # handler never sees one without the other
+    with plan_transaction() as path:
+        save_habit_data(log)
+        plan = _read_plan_file(path)
+        _, changed = _complete_next_session(plan)
+        if changed:
+            _write_plan(plan, path)
     return "Study session saved!"
-    complete_next_session()
 
+@metrics.instrument()
 def get_study_hours_by_task():
-    logs = load_habit_data()
+    return dict(load_habit_stats()["task_hours"])
 
-    if not logs:
-        return {}
 
-    task_hours = defaultdict(float)
+@metrics.instrument()
+def calculate_total_hours(logs=None):
+    # Without logs, read the running total from the aggregate sidecar
+    if logs is None:
+        return load_habit_stats()["total_hours"]
+    return sum(log.get("hours", 0) for log in logs)
 
-    for log in logs:
-        task = log.get("task")
-        hours = log.get("hours", 0)
+def _daily_matrix(logs=None):
+    # Without logs, the sidecar's hours-per-date map is all streaks need
+    if logs is None:
+        return analytics.from_daily_hours(load_habit_stats()["daily_hours"], end=date.today())
+    return analytics.build(logs, end=date.today())
 
-        if task:
-            task_hours[task] += hours
 
-    return dict(task_hours)
-def calculate_total_hours(logs):
-    return sum(log.get("hours", 0) for log in logs)
+@metrics.instrument()
+def calculate_streak(logs=None):
+    """Consecutive study days up to today (or yesterday)."""
+    return analytics.current_streak(_daily_matrix(logs))
 
-def calculate_streak(logs):
-    # unique study dates
-    dates = {log.get("date") for log in logs if "date" in log}
-    return len(dates)
 
+@metrics.instrument()
+def calculate_longest_streak(logs=None):
+    return analytics.longest_streak(_daily_matrix(logs))
 
 
-def generate_quick_insights():
-    logs = load_habit_data()
+@metrics.instrument()
+def habit_kpis(stats=None):
+    """
+    (total hours, current streak, longest streak) from one read of the
+    sidecar and one HabitMatrix. stats reuses an already loaded sidecar.
+    """
+    stats = stats or load_habit_stats()
+    matrix = analytics.from_daily_hours(stats["daily_hours"], end=date.today())
+    return stats["total_hours"], analytics.current_streak(matrix), analytics.longest_streak(matrix)
 
-    prompt = QUICK_INSIGHTS_PROMPT.format(logs=logs)
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
+@metrics.instrument()
+def get_habit_analytics(today=None):
+    """
+    Streaks, rolling 7/28-day averages, weekday profile and per-task
+    trends over the whole habit log (see analytics.summarise).
+    """
+    today = today or date.today()
+    matrix = habit_columnar.to_matrix(load_habit_columns(), end=today)
+    return analytics.summarise(matrix, today)
+
 
-    return response.choices[0].message.content
+@metrics.instrument()
+def load_habit_columns():
+    """
+    The habit log as compact columns (see habit_columnar.py): memory-mapped
+    from habit_columns/, after appending any entries logged since the last
+    call. With SQLite storage the columns are built in memory.
+    """
+    if STORAGE == "sqlite":
+        return habit_columnar.from_entries(iter_habit_data())
 
+    migrate_legacy_habit_log()
+    directory = habit_columns_path()
+    with locked(directory):
+        habit_columnar.sync(directory, habit_log_path())
+    return habit_columnar.load(directory)
 
 
-def generate_weekly_summary():
-    logs = load_habit_data()
 
-    prompt = WEEKLY_SUMMARY_PROMPT.format(logs=logs)
+def _habit_summary_text(window_days):
+    start, end = habit_summary.window_for(window_days)
+    summary = habit_summary.summarise_habits(habits_between(start, end), start, end)
+    return habit_summary.format_summary(summary)
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
 
-    return response.choices[0].message.content
+def _offline_insights(summary_text):
+    return "AI insights are unavailable right now. Your numbers:\n\n" + summary_text
+
+
+@metrics.instrument()
+def generate_quick_insights(window_days=28, use_cache=True):
+    summary = _habit_summary_text(window_days)
+    prompt = QUICK_INSIGHTS_PROMPT.format(summary=summary)
+
+    return _chat("insights", prompt, use_cache=use_cache,
+                 fallback=lambda: _offline_insights(summary))
+
+
+
+@metrics.instrument()
+def generate_weekly_summary(window_days=7, use_cache=True):
+    summary = _habit_summary_text(window_days)
+    prompt = WEEKLY_SUMMARY_PROMPT.format(summary=summary)
+
+    return _chat("summary", prompt, use_cache=use_cache,
+                 fallback=lambda: _offline_insights(summary))
+
+
+@metrics.instrument()
+def stream_quick_insights(window_days=28, use_cache=True):
+    summary = _habit_summary_text(window_days)
+    prompt = QUICK_INSIGHTS_PROMPT.format(summary=summary)
+    yield from _chat_stream("insights", prompt, use_cache=use_cache,
+                            fallback=lambda: _offline_insights(summary))
+
+
+@metrics.instrument()
+def stream_weekly_summary(window_days=7, use_cache=True):
+    summary = _habit_summary_text(window_days)
+    prompt = WEEKLY_SUMMARY_PROMPT.format(summary=summary)
+    yield from _chat_stream("summary", prompt, use_cache=use_cache,
+                            fallback=lambda: _offline_insights(summary))
 
 
 def generate_quote():
     prompt = QUOTE_PROMPT
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content
+    return _chat("quote", prompt)
 
 
-def complete_current_task():
-    plan = load_study_plan()
+@metrics.instrument()
+def generate_quotes(count):
+    """Fetches several quotes in a single request."""
+    text = _chat("quote", QUOTE_BATCH_PROMPT.format(count=count))
+
+    quotes = []
+    for line in text.splitlines():
+        line = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip().strip('"“”')
+        if line:
+            quotes.append(line)
+    return quotes[:count]
+
+
+quote_pool = QuotePool(generate_quotes)
+
+
+def next_quote():
+    """Serves a quote from the pool without waiting on the LLM."""
+    return quote_pool.next_quote()
+
+
+def _complete_current_task(plan):
     if not plan or not plan.get("next_task"):
-        return "<div class='next-task'>No active task.</div>"
+        return "<div class='next-task'>No active task.</div>", False
 
     current = plan["next_task"]
 
     # Prevent double completion
     if current in plan["completed_tasks"]:
-        return "<div class='next-task'>Task already completed.</div>"
+        return "<div class='next-task'>Task already completed.</div>", False
 
     plan["completed_tasks"].append(current)
 
@@ -353,10 +1191,9 @@ def complete_current_task():
         plan["next_task"] = None
         message = " All tasks completed!"
 
-    
+    return f"<div class='next-task'>{message}</div>", True
 
-    with open(PLAN_PATH, "w") as f:
-        json.dump(plan, f, indent=2)
-
-    return f"<div class='next-task'>{message}</div>"
 
+@metrics.instrument()
+def complete_current_task():
+    return update_plan(_complete_current_task)
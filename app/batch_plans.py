@@ -0,0 +1,236 @@
+"""
+Headless bulk plan generation for a whole cohort.
+
+Reads one row per user from a CSV or JSONL file with the columns
+id, tasks, hours, difficulty, style, deadline (and optional deadline_name),
+generates each plan like prepare_plan does, saves it into that user's
+data directory and appends one JSON line per row to the output file:
+
+    python batch_plans.py cohort.csv --out plans.jsonl --workers 8
+
+In CSV files tasks are separated by ";". Rows already in the output with
+status "ok" are skipped, so an interrupted run can simply be restarted.
+Upstream concurrency is still capped by llm_pool's "plan" limit.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import argparse
+import csv
+import json
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+
+import backend
+from user_state import user_scope
+
+
+# ------------------------------------------------------------
+# INPUT
+# ------------------------------------------------------------
+def _task_list(value):
+    if isinstance(value, list):
+        return [str(t).strip() for t in value if str(t).strip()]
+    return [t.strip() for t in str(value or "").split(";") if t.strip()]
+
+
+def normalise_row(raw, line_no):
+    """Turns one input record into the arguments prepare_plan would get."""
+    tasks = _task_list(raw.get("tasks"))
+    if not tasks:
+        raise ValueError("no tasks")
+    return {
+        "id": str(raw.get("id") or f"row-{line_no}"),
+        "tasks": tasks,
+        "hours": int(raw.get("hours") or 1),
+        "difficulty": raw.get("difficulty") or "Medium",
+        "style": raw.get("style") or "Pomodoro",
+        "deadline": raw.get("deadline") or None,
+        "deadline_name": raw.get("deadline_name") or "Deadline",
+    }
+
+
+def read_rows(path):
+    """Yields (line_no, raw_record) from a .csv or .jsonl file."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for i, raw in enumerate(csv.DictReader(f), start=1):
+                yield i, raw
+        else:
+            for i, line in enumerate(f, start=1):
+                if line.strip():
+                    yield i, json.loads(line)
+
+
+def completed_ids(out_path):
+    """Ids already written with status "ok" (torn last lines are ignored)."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("status") == "ok":
+                done.add(entry["id"])
+    return done
+
+
+# ------------------------------------------------------------
+# WORK
+# ------------------------------------------------------------
+def generate_one(row):
+    """Generates and saves one user's plan inside that user's scope."""
+    start = time.perf_counter()
+    tasks_joined = "\n".join(row["tasks"])
+
+    with user_scope(row["id"]):
+        sessions = None
+        # No offline placeholder plans: an unavailable LLM fails the row,
+        # so it is retried when the batch is resumed
+        if backend.STUDY_PLAN_MODE == "json":
+            plan, sessions = backend.generate_study_plan_structured(
+                tasks_joined, row["hours"], row["difficulty"], row["style"],
+                offline_fallback=False
+            )
+        else:
+            plan = backend.generate_study_plan(
+                tasks_joined, row["hours"], row["difficulty"], row["style"],
+                offline_fallback=False
+            )
+
+        backend.save_study_plan(
+            plan_text=plan,
+            tasks=row["tasks"],
+            hours=row["hours"],
+            study_style=row["style"],
+            deadline={"name": row["deadline_name"], "date": row["deadline"]},
+            structured_sessions=sessions
+        )
+        saved = backend.load_study_plan()
+
+    return {
+        "id": row["id"],
+        "status": "ok",
+        "sessions": len(saved.get("sessions", [])),
+        "plan": plan,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+    }
+
+
+class Progress:
+    """Completion counter with throughput and latency figures."""
+
+    def __init__(self, total, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.ok = 0
+        self.failed = 0
+        self.latencies = []
+        self.started = time.perf_counter()
+
+    def record(self, result):
+        if result["status"] == "ok":
+            self.ok += 1
+            self.latencies.append(result["elapsed_s"])
+        else:
+            self.failed += 1
+
+        done = self.ok + self.failed
+        elapsed = time.perf_counter() - self.started
+        rate = done / elapsed if elapsed else 0.0
+        eta = (self.total - done) / rate if rate and self.total else 0.0
+        print(
+            f"[{done}/{self.total or '?'}] {result['status']:<5} {result['id']} "
+            f"| {rate:.2f} plans/s, eta {eta:.0f}s",
+            file=self.stream
+        )
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        lat = sorted(self.latencies)
+        return {
+            "ok": self.ok,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 3),
+            "plans_per_s": round(self.ok / elapsed, 3) if elapsed else 0.0,
+            "latency_p50_s": round(statistics.median(lat), 3) if lat else None,
+            "latency_p95_s": round(lat[math.ceil(0.95 * len(lat)) - 1], 3) if lat else None,
+        }
+
+
+def run_batch(in_path, out_path, workers=4):
+    """Processes every pending row; returns the summary dict."""
+    done = completed_ids(out_path)
+    pending_rows = []
+    invalid = []
+    for line_no, raw in read_rows(in_path):
+        try:
+            row = normalise_row(raw, line_no)
+        except (ValueError, TypeError) as e:
+            invalid.append({"id": str(raw.get("id") or f"row-{line_no}"),
+                            "status": "error", "error": f"invalid row: {e}"})
+            continue
+        if row["id"] not in done:
+            pending_rows.append(row)
+
+    if done:
+        print(f"Resuming: {len(done)} rows already done", file=sys.stderr)
+
+    progress = Progress(len(pending_rows) + len(invalid))
+    write_lock = threading.Lock()
+
+    with open(out_path, "a", encoding="utf-8") as out:
+        def emit(result):
+            with write_lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                progress.record(result)
+
+        for result in invalid:
+            emit(result)
+
+        rows = iter(pending_rows)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-plan") as pool:
+            while True:
+                # Keep at most 2x workers queued so huge cohorts stay lazy
+                while len(in_flight) < workers * 2:
+                    row = next(rows, None)
+                    if row is None:
+                        break
+                    in_flight[pool.submit(generate_one, row)] = row
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    row = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"id": row["id"], "status": "error", "error": str(e)}
+                    emit(result)
+
+    return progress.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="cohort file (.csv or .jsonl)")
+    parser.add_argument("--out", default="plans.jsonl", help="results file (JSONL, appended)")
+    parser.add_argument("--workers", type=int, default=4, help="plans generated in parallel")
+    args = parser.parse_args()
+
+    summary = run_batch(args.input, args.out, workers=max(args.workers, 1))
+    print(json.dumps(summary, indent=2))
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
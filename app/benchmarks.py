@@ -0,0 +1,308 @@
+"""
+Benchmarks for the code that runs on every interaction.
+
+Runs the parsing, persistence, aggregation and rendering hot paths against
+synthetic plans (8-500 hours) and habit logs (1k-1M entries) in a
+throwaway data directory, and writes the timings as JSON so two commits
+can be compared:
+
+    python benchmarks.py --out bench_results/new.json
+    python benchmarks.py --quick
+    python benchmarks.py --compare bench_results/old.json bench_results/new.json
+
+--startup measures cold start instead (import time of app.py and time until
+the first page is served) and appends it to bench_results/startup_history.jsonl.
+"""
+from datetime import date, timedelta
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import backend
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, "bench_results")
+STARTUP_HISTORY = os.path.join(RESULTS_DIR, "startup_history.jsonl")
+
+PLAN_HOURS = [8, 50, 500]
+HABIT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+QUICK_PLAN_HOURS = [8, 50]
+QUICK_HABIT_SIZES = [1_000, 10_000]
+
+TASKS = [f"Task {i}" for i in range(20)]
+
+
+# ------------------------------------------------------------
+# SYNTHETIC DATA
+# ------------------------------------------------------------
+def synthetic_plan(hours):
+    blocks = []
+    for i in range(hours):
+        task = TASKS[i % len(TASKS)]
+        blocks.append(
+            f"### Study Hour {i + 1}: {task}\n"
+            f"- **Duration:** 1 hour\n"
+            f"Focus:\n25 minutes focus on {task}\nShort break\n25 minutes practice\n"
+            f"Notes:\n"
+            f"- **Notes:**\n  - Review the summary of {task}\n  - Do two practice questions\n\n---"
+        )
+    return "\n".join(blocks) + "\n**Motivational message:** Keep going!"
+
+
+def write_habit_log(path, entries, seed=0):
+    rng = random.Random(seed)
+    today = date.today()
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(entries):
+            f.write(json.dumps({
+                "date": (today - timedelta(days=rng.randint(0, 364))).isoformat(),
+                "task": rng.choice(TASKS),
+                "hours": rng.choice([0.5, 1, 1.5, 2, 3])
+            }) + "\n")
+
+
+def calendar_tasks(filled, seed=0):
+    from calendar_module import TIMES
+
+    rng = random.Random(seed)
+    cells = [(di, t) for di in range(7) for t in TIMES]
+    return {
+        cell: {"label": rng.choice(TASKS), "notes": "", "session_id": None}
+        for cell in rng.sample(cells, min(filled, len(cells)))
+    }
+
+
+# ------------------------------------------------------------
+# HARNESS
+# ------------------------------------------------------------
+def use_data_dir(path):
+    """Points backend persistence at a scratch directory."""
+    backend.DATA_DIR = path
+    backend.PLAN_PATH = os.path.join(path, "current_plan.json")
+    backend.HABIT_LOG_PATH = os.path.join(path, "habit_log.jsonl")
+    backend.LEGACY_HABIT_LOG_PATH = os.path.join(path, "habit_log.json")
+    backend.HABIT_STATS_PATH = os.path.join(path, "habit_stats.json")
+    backend.invalidate_plan_cache()
+
+
+def measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(times), 4),
+        "median_ms": round(statistics.median(times), 4),
+        "mean_ms": round(statistics.fmean(times), 4),
+    }
+
+
+def _repeat_for(size):
+    return 20 if size <= 10_000 else 5 if size <= 100_000 else 2
+
+
+def bench_plans(results, plan_hours):
+    for hours in plan_hours:
+        text = synthetic_plan(hours)
+        tasks = TASKS[:5]
+        scale = f"{hours}h"
+        results.append({"name": "extract_focus_blocks", "scale": scale,
+                        **measure(lambda: backend.extract_focus_blocks(text), 50)})
+        results.append({"name": "extract_notes_lines", "scale": scale,
+                        **measure(lambda: backend.extract_notes_lines(text), 50)})
+        results.append({"name": "save_study_plan", "scale": scale,
+                        **measure(lambda: backend.save_study_plan(text, tasks, hours, "Pomodoro"), 20)})
+
+
+def bench_habits(results, habit_sizes, data_dir):
+    from calendar_module import render_planner_html, start_of_week
+
+    for size in habit_sizes:
+        scale = f"{size}"
+        repeat = _repeat_for(size)
+        write_habit_log(backend.HABIT_LOG_PATH, size)
+        if os.path.exists(backend.HABIT_STATS_PATH):
+            os.remove(backend.HABIT_STATS_PATH)
+
+        results.append({"name": "rebuild_habit_stats", "scale": scale,
+                        **measure(backend.rebuild_habit_stats, repeat)})
+        results.append({"name": "save_habit_data", "scale": scale,
+                        **measure(lambda: backend.save_habit_data(
+                            {"date": date.today().isoformat(), "task": "Task 0", "hours": 1}), 20)})
+        results.append({"name": "get_study_hours_by_task", "scale": scale,
+                        **measure(backend.get_study_hours_by_task, 20)})
+        results.append({"name": "calculate_streak", "scale": scale,
+                        **measure(backend.calculate_streak, 20)})
+
+        logs = backend.load_habit_data()
+        results.append({"name": "load_habit_data", "scale": scale,
+                        **measure(backend.load_habit_data, repeat)})
+        results.append({"name": "calculate_streak(logs)", "scale": scale,
+                        **measure(lambda: backend.calculate_streak(logs), repeat)})
+        del logs
+
+        bench_donut(results, scale)
+
+    week = start_of_week(date.today())
+    backend.save_study_plan(synthetic_plan(8), TASKS[:5], 8, "Pomodoro",
+                            {"name": "Exam", "date": week.isoformat()})
+    for filled in [0, 20, 91]:
+        tasks = calendar_tasks(filled)
+        results.append({"name": "render_planner_html", "scale": f"{filled} cells",
+                        **measure(lambda: render_planner_html(week, tasks), 50)})
+
+
+def bench_donut(results, scale):
+    """Per-refresh donut cost: cold render, cached refresh, and the SVG renderer."""
+    import charts
+
+    results.append({"name": "render_donut_chart[svg] cold", "scale": scale,
+                    **measure(lambda: charts.render_donut_chart("svg"), 20,
+                              setup=charts.clear_chart_cache)})
+    results.append({"name": "render_donut_chart[svg] cached", "scale": scale,
+                    **measure(lambda: charts.render_donut_chart("svg"), 20)})
+
+    try:
+        import matplotlib
+    except ImportError:
+        return
+    matplotlib.use("Agg")
+    results.append({"name": "render_donut_chart cold", "scale": scale,
+                    **measure(charts.render_donut_chart, 5, setup=charts.clear_chart_cache)})
+    results.append({"name": "render_donut_chart cached", "scale": scale,
+                    **measure(charts.render_donut_chart, 20)})
+    charts.clear_chart_cache()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True,
+            stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(quick=False):
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        use_data_dir(data_dir)
+        bench_plans(results, QUICK_PLAN_HOURS if quick else PLAN_HOURS)
+        bench_habits(results, QUICK_HABIT_SIZES if quick else HABIT_SIZES, data_dir)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def measure_startup(port=7899, timeout=120):
+    """
+    Cold-start timings in fresh interpreters: `import app`, and launching
+    app.py until http://127.0.0.1:<port>/ answers. The LLM is stubbed out
+    (replay mode) so startup does not wait on the network.
+    """
+    env = dict(os.environ, GRADIO_SERVER_PORT=str(port), LLM_BACKEND="replay")
+
+    import_s = float(subprocess.check_output(
+        [sys.executable, "-c",
+         "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"],
+        cwd=BASE_DIR, env=env, text=True
+    ).strip().splitlines()[-1])
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "app.py"], cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    first_page_s = None
+    try:
+        while time.perf_counter() - start < timeout and proc.poll() is None:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as r:
+                    if r.status == 200:
+                        first_page_s = time.perf_counter() - start
+                        break
+            except OSError:
+                time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "import_app_s": round(import_s, 4),
+        "first_page_s": round(first_page_s, 4) if first_page_s is not None else None,
+    }
+
+
+def compare(old_path, new_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = {(r["name"], r["scale"]): r for r in json.load(f)["results"]}
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)["results"]
+
+    print(f"{'benchmark':<34}{'scale':>12}{'old ms':>12}{'new ms':>12}{'ratio':>8}")
+    for r in new:
+        before = old.get((r["name"], r["scale"]))
+        if not before:
+            continue
+        ratio = r["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        print(f"{r['name']:<34}{r['scale']:>12}{before['median_ms']:>12.3f}"
+              f"{r['median_ms']:>12.3f}{ratio:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quick", action="store_true", help="small scales only")
+    parser.add_argument("--out", help="where to write the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--startup", action="store_true", help="measure cold start only")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.startup:
+        result = measure_startup()
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(STARTUP_HISTORY, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+        print(json.dumps(result, indent=2))
+        return
+
+    report = run(quick=args.quick)
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for r in report["results"]:
+        print(f"{r['name']:<34}{r['scale']:>12}{r['median_ms']:>12.3f} ms")
+    print(f"Results written to {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
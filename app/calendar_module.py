@@ -1,6 +1,12 @@
-import gradio as gr
 from datetime import date, timedelta,datetime
+import logging
 from backend import load_study_plan
+import calendar_store
+import metrics
+import profiling
+from user_state import per_user
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -165,8 +171,19 @@ def week_label(week_start: date) -> str:
     week_end = week_start + timedelta(days=6)
     return f"Week: {week_start.isoformat()} → {week_end.isoformat()}"
 
-def render_planner_html(week_start: date, tasks: dict) -> str:
-    head = f"""
+# ------------------------------------------------------------
+# PRECOMPILED GRID
+# ------------------------------------------------------------
+# Static pieces are built once; a render only fills in the cells,
+# rows and day headers that actually have content.
+_TIME_ROW = {t: i for i, t in enumerate(TIMES)}
+_EMPTY_SLOT = '<div class="pl-cell pl-slot"></div>'
+_TIME_CELLS = [f'<div class="pl-cell pl-time">{t}</div>' for t in TIMES]
+_EMPTY_ROWS = [
+    f'<div class="pl-row">{cell}{_EMPTY_SLOT * 7}</div>' for cell in _TIME_CELLS
+]
+
+_HEAD_OPEN = f"""
     <div id="planner_wrap">
       <div id="topbar">
         <div id="title">Weekly Planner</div>
@@ -177,64 +194,114 @@ def render_planner_html(week_start: date, tasks: dict) -> str:
       </div>
 
       <div style="text-align:center; color:{PINK}; font-weight:700; margin-bottom:10px;">
-        {week_label(week_start)}
+        """
+_HEAD_GRID = """
       </div>
 
       <div id="grid">
         <div class="pl-row pl-head">
           <div class="pl-cell pl-day">Time</div>
-          {"".join([
-    f'''
+          """
+_HEAD_CLOSE = """
+
+        </div>
+    """
+_TAIL = """
+      </div>
+    </div>
+    """
+
+
+def _day_head(i, badges=""):
+    return f'''
     <div class="pl-cell pl-day {"active" if i==0 else ""}">
-        <div class="day-name">{d}</div>
-        {render_deadline_badge(week_start + timedelta(days=i))}
+        <div class="day-name">{DAYS[i]}</div>
+        {badges}
     </div>
     '''
-    for i, d in enumerate(DAYS)
-])}
 
-        </div>
-    """
 
-    rows = []
-    for t in TIMES:
-        row_cells = [f'<div class="pl-cell pl-time">{t}</div>']
-        for di in range(7):
-            cell = tasks.get((di, t), "")
-            txt = cell["label"] if isinstance(cell, dict) else (cell or "")
+_EMPTY_DAY_HEADS = [_day_head(i) for i in range(7)]
 
-            row_cells.append(f'<div class="pl-cell pl-slot">{txt}</div>')
-        rows.append(f'<div class="pl-row">{"".join(row_cells)}</div>')
 
-    tail = """
-      </div>
-    </div>
-    """
-    return head + "\n".join(rows) + tail
-def render_deadline_badge(day_date: date) -> str:
-    plan = load_study_plan()
-    if not plan:
-        return ""
+# ------------------------------------------------------------
+# DEADLINE INDEX
+# ------------------------------------------------------------
+# (plan object it was built from, {iso date: badge html})
+_deadline_index = (None, {})
 
-    badges = []
 
-    for d in plan.get("deadlines", []):
-        if d["date"] == day_date.isoformat():
-            badges.append(
-                f"""
+def deadline_badges_by_date(plan):
+    """
+    Badge HTML per ISO date, built once per plan version.
+    load_study_plan returns the same object until the file changes,
+    so an identity check is enough to detect a new version.
+    """
+    global _deadline_index
+    cached_plan, index = _deadline_index
+    if plan is cached_plan:
+        return index
+
+    index = {}
+    for d in (plan or {}).get("deadlines", []):
+        day = str(d.get("date", ""))[:10]  # "YYYY-MM-DD" or "YYYY-MM-DD HH:MM"
+        try:
+            label = format_date_eu(day)
+        except ValueError:
+            continue
+        index[day] = index.get(day, "") + f"""
                 <div class="deadline-badge">
-                    📌 {d['name']} — {format_date_eu(d['date'])}
+                    📌 {d['name']} — {label}
                 </div>
                 """
-            )
 
-    return "".join(badges)
+    _deadline_index = (plan, index)
+    return index
+
+
+@metrics.instrument()
+def render_planner_html(week_start: date, tasks: dict) -> str:
+    badges = deadline_badges_by_date(load_study_plan())
+
+    day_heads = list(_EMPTY_DAY_HEADS)
+    if badges:
+        for i in range(7):
+            badge = badges.get((week_start + timedelta(days=i)).isoformat())
+            if badge:
+                day_heads[i] = _day_head(i, badge)
+
+    # Group filled cells by row; untouched rows reuse the prebuilt HTML
+    filled_rows = {}
+    for (di, t), cell in tasks.items():
+        txt = cell["label"] if isinstance(cell, dict) else (cell or "")
+        if txt and t in _TIME_ROW:
+            filled_rows.setdefault(_TIME_ROW[t], {})[di] = txt
+
+    rows = list(_EMPTY_ROWS)
+    for ri, cells in filled_rows.items():
+        slots = [_EMPTY_SLOT] * 7
+        for di, txt in cells.items():
+            slots[di] = f'<div class="pl-cell pl-slot">{txt}</div>'
+        rows[ri] = f'<div class="pl-row">{_TIME_CELLS[ri]}{"".join(slots)}</div>'
+
+    return (
+        _HEAD_OPEN + week_label(week_start) + _HEAD_GRID
+        + "".join(day_heads) + _HEAD_CLOSE
+        + "\n".join(rows) + _TAIL
+    )
+
+
+def render_deadline_badge(day_date: date) -> str:
+    return deadline_badges_by_date(load_study_plan()).get(day_date.isoformat(), "")
 
 def init_state():
+    # Slots live in calendar_store, keyed by week; session state only
+    # remembers which week is on screen
     return {
-        "week_start": start_of_week(date.today()),
-        "tasks": {}  # (day_index, time_str) -> str
+        "week_start": start_of_week(date.today())
     }
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def assign_session_to_slot(state, day_name, time_str, session_id):
     if not session_id:
         return ui_refresh(state)
@@ -251,59 +318,84 @@ def assign_session_to_slot(state, day_name, time_str, session_id):
         return ui_refresh(state)
 
     di = DAYS.index(day_name)
-    state["tasks"][(di, time_str)] = {
-        "label": session["task"],
-        "notes": session.get("notes", ""),
-        "session_id": session_id
-    }
+    calendar_store.update_week(state["week_start"], lambda tasks: tasks.update({
+        (di, time_str): {
+            "label": session["task"],
+            "notes": session.get("notes", ""),
+            "session_id": session_id
+        }
+    }))
 
     return ui_refresh(state)
 
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def ui_refresh(state):
-    return render_planner_html(state["week_start"], state["tasks"]), week_label(state["week_start"])
+    week_start = state["week_start"]
+    html = render_planner_html(week_start, calendar_store.get_week(week_start))
+    calendar_store.prefetch_adjacent(week_start)
+    return html, week_label(week_start)
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def session_choices():
     plan = load_study_plan()
-    print("DEBUG plan loaded in calendar:", plan)
+    logger.debug("Plan loaded in calendar: %d sessions", len(plan.get("sessions", [])) if plan else 0)
     sessions = plan.get("sessions", []) if plan else []
 
     choices = [(f"Session {s['session_id']} — {s['task']}", s["session_id"]) for s in sessions]
 
     # IMPORTANT: return an update so Gradio sets choices + clears value safely
+    import gradio as gr
     return gr.update(choices=choices, value=None)
 
 
 
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def prev_week(state):
     state["week_start"] = state["week_start"] - timedelta(days=7)
     return ui_refresh(state)
 
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def next_week(state):
     state["week_start"] = state["week_start"] + timedelta(days=7)
     return ui_refresh(state)
 
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def add_task(state, day_name, time_str, text):
     if not text.strip():
         return ui_refresh(state)
     di = DAYS.index(day_name)
-    state["tasks"][(di, time_str)] = {
-    "label": text.strip(),
-    "notes": "",
-    "session_id": None
-}
+    calendar_store.update_week(state["week_start"], lambda tasks: tasks.update({
+        (di, time_str): {
+            "label": text.strip(),
+            "notes": "",
+            "session_id": None
+        }
+    }))
 
 
     return ui_refresh(state)
 
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def cancel_clear(state):
-    state["tasks"] = {}
+    calendar_store.save_week(state["week_start"], {})
     return ui_refresh(state)
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def save_export_json(state):
+    tasks = calendar_store.get_week(state["week_start"])
+    calendar_store.save_week(state["week_start"], tasks)
+
     out = {
         "week_start": state["week_start"].isoformat(),
         "tasks": []
     }
 
-    for (di, t), cell in sorted(state["tasks"].items(), key=lambda x: (x[0][0], x[0][1])):
+    for (di, t), cell in sorted(tasks.items(), key=lambda x: (x[0][0], x[0][1])):
         if isinstance(cell, dict):
             out["tasks"].append({
                 "day": DAYS[di],
@@ -321,9 +413,11 @@ def save_export_json(state):
 
     return out
 
+@metrics.instrument(kind="handler")
+@profiling.profiled()
 def view_slot_notes(state, day_name, time_str):
     di = DAYS.index(day_name)
-    cell = state["tasks"].get((di, time_str))
+    cell = calendar_store.get_week(state["week_start"]).get((di, time_str))
     if isinstance(cell, dict):
         return cell.get("notes", "")
     return "No notes for this slot."
@@ -337,9 +431,11 @@ def view_slot_notes(state, day_name, time_str):
 
 
 def calendar_tab():
+    import gradio as gr
+
     # Local state for this tab
     
-    print("DEBUG calendar_tab called")
+    logger.debug("calendar_tab called")
 
     state = gr.State(init_state())
     
@@ -378,33 +474,33 @@ def calendar_tab():
 
     # Initial render (replaces demo.load)
     # In a tab/module, we trigger it using planner_html's load event.
-    planner_html.load(fn=ui_refresh, inputs=state, outputs=[planner_html, week_text])
+    planner_html.load(fn=per_user(ui_refresh), inputs=state, outputs=[planner_html, week_text])
    
 
     # Wire buttons 
-    prev_btn.click(fn=prev_week, inputs=state, outputs=[planner_html, week_text])
-    next_btn.click(fn=next_week, inputs=state, outputs=[planner_html, week_text])
+    prev_btn.click(fn=per_user(prev_week), inputs=state, outputs=[planner_html, week_text])
+    next_btn.click(fn=per_user(next_week), inputs=state, outputs=[planner_html, week_text])
 
-    add_btn.click(fn=add_task, inputs=[state, day_dd, time_dd, task_tb], outputs=[planner_html, week_text])
-    cancel_btn.click(fn=cancel_clear, inputs=state, outputs=[planner_html, week_text])
-    save_btn.click(fn=save_export_json, inputs=state, outputs=saved_out)
+    add_btn.click(fn=per_user(add_task), inputs=[state, day_dd, time_dd, task_tb], outputs=[planner_html, week_text])
+    cancel_btn.click(fn=per_user(cancel_clear), inputs=state, outputs=[planner_html, week_text])
+    save_btn.click(fn=per_user(save_export_json), inputs=state, outputs=saved_out)
    
 
     assign_btn = gr.Button("＋ Assign Session to Slot", elem_classes=["action"])
     assign_btn.click(
-    fn=assign_session_to_slot,
+    fn=per_user(assign_session_to_slot),
     inputs=[state, day_dd, time_dd, session_dd],
     outputs=[planner_html, week_text]
 )
     view_btn = gr.Button("View Slot Notes", variant="secondary")
     notes_box = gr.Textbox(label="Session Notes", lines=6)
     view_btn.click(
-    fn=view_slot_notes,
+    fn=per_user(view_slot_notes),
     inputs=[state, day_dd, time_dd],
     outputs=notes_box
 )   
     refresh_sessions_btn.click(
-    fn=session_choices,
+    fn=per_user(session_choices),
     inputs=None,
     outputs=session_dd
 )
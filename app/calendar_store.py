@@ -0,0 +1,134 @@
+"""
+Persistent calendar slots, one JSON file per week.
+
+Weeks are stored under the user's data directory as calendar/<monday>.json
+and loaded lazily into a small in-process LRU cache. After a week is shown,
+the previous and next weeks are loaded in the background so week
+navigation is a cache hit.
+"""
+from collections import OrderedDict
+from datetime import date, timedelta
+import json
+import logging
+import os
+import threading
+import time
+
+import backend
+from file_locks import locked
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_WEEKS = 64
+
+# (calendar dir, week ISO date) -> (file mtime_ns or None, {(day_index, time): cell})
+_weeks = OrderedDict()
+_lock = threading.Lock()
+
+
+def calendar_dir():
+    """Calendar directory of the current user (see backend.DATA_DIR)."""
+    path = backend.user_path("calendar", os.path.join(backend.BASE_DIR, "calendar"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _week_path(directory, week_start: date):
+    return os.path.join(directory, f"{week_start.isoformat()}.json")
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _read_week(path):
+    tasks = {}
+    if not os.path.exists(path):
+        return tasks
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        raw = f.read()
+    metrics.record_io(path, "read", len(raw), time.perf_counter() - start)
+    for cell in json.loads(raw).get("tasks", []):
+        tasks[(cell["day"], cell["time"])] = {
+            "label": cell.get("label", ""),
+            "notes": cell.get("notes", ""),
+            "session_id": cell.get("session_id")
+        }
+    return tasks
+
+
+def _remember(key, mtime, tasks):
+    with _lock:
+        _weeks[key] = (mtime, tasks)
+        _weeks.move_to_end(key)
+        while len(_weeks) > MAX_CACHED_WEEKS:
+            _weeks.popitem(last=False)
+
+
+def _load(directory, week_start: date):
+    key = (directory, week_start.isoformat())
+    path = _week_path(directory, week_start)
+    mtime = _mtime(path)
+
+    with _lock:
+        cached = _weeks.get(key)
+        if cached is not None and cached[0] == mtime:
+            _weeks.move_to_end(key)
+            return cached[1]
+
+    tasks = _read_week(path)
+    _remember(key, mtime, tasks)
+    return tasks
+
+
+def get_week(week_start: date) -> dict:
+    """Slots for one week as {(day_index, time): cell}. Treat as read-only."""
+    return _load(calendar_dir(), week_start)
+
+
+def save_week(week_start: date, tasks: dict):
+    directory = calendar_dir()
+    path = _week_path(directory, week_start)
+    data = {
+        "week_start": week_start.isoformat(),
+        "tasks": [
+            {"day": di, "time": t, **cell}
+            for (di, t), cell in sorted(tasks.items())
+        ]
+    }
+    with locked(path):
+        backend.write_json_atomic(path, data)
+        _remember((directory, week_start.isoformat()), _mtime(path), dict(tasks))
+
+
+def update_week(week_start: date, change):
+    """
+    Applies change(tasks) to the week and saves it. The week file stays
+    locked from the read to the save, and is read from disk rather than
+    the cache, so concurrent updates (other workers too) are not lost.
+    """
+    path = _week_path(calendar_dir(), week_start)
+    with locked(path):
+        tasks = _read_week(path)
+        change(tasks)
+        save_week(week_start, tasks)
+    return tasks
+
+
+def prefetch_adjacent(week_start: date):
+    """Loads the previous and next week in the background."""
+    directory = calendar_dir()
+
+    def run():
+        for delta in (-7, 7):
+            try:
+                _load(directory, week_start + timedelta(days=delta))
+            except (OSError, ValueError) as e:
+                logger.warning("Calendar prefetch failed: %s", e)
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,164 @@
+"""
+Donut chart of study hours per task.
+
+Both renderers return HTML for gr.HTML: Matplotlib draws a PNG inlined
+as a data URI, SENSEFLOW_DONUT_RENDERER=svg a plain SVG string without
+importing Matplotlib. The HTML is memoized on the
+get_study_hours_by_task() data, so a dashboard refresh with unchanged
+data sends the already encoded chart.
+"""
+from collections import OrderedDict
+import base64
+import html
+import io
+import math
+import os
+import threading
+
+from backend import get_study_hours_by_task
+
+DONUT_RENDERER = os.getenv("SENSEFLOW_DONUT_RENDERER", "matplotlib")
+
+MAX_CACHED_CHARTS = 32
+_chart_cache = OrderedDict()  # (renderer, data key) -> chart HTML
+_chart_lock = threading.Lock()
+
+# Matplotlib's default colour cycle, so both renderers look alike
+COLORS = [
+    "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+    "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf",
+]
+
+
+def _data_key(data):
+    return tuple(sorted(data.items()))
+
+
+def _png_html(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    encoded = base64.b64encode(buf.getvalue()).decode("ascii")
+    return f'<img src="data:image/png;base64,{encoded}" alt="Study Time Breakdown"/>'
+
+
+def render_donut_matplotlib(data):
+    """The donut as an <img> with an inline PNG."""
+    # A bare Figure (no pyplot) is not registered globally: nothing to close
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(4, 4))
+    ax = fig.subplots()
+
+    if not data:
+        ax.text(0.5, 0.5, "No study data yet",
+                ha="center", va="center", fontsize=12)
+        ax.axis("off")
+        return _png_html(fig)
+
+    labels = list(data.keys())
+    values = list(data.values())
+
+    ax.pie(
+        values,
+        labels=labels,
+        autopct="%1.0f%%",
+        startangle=90,
+        wedgeprops=dict(width=0.4)
+    )
+
+    ax.set_title("Study Time Breakdown")
+
+    return _png_html(fig)
+
+
+def render_donut_svg(data, size=320):
+    """Same donut as the Matplotlib version, as a standalone SVG string."""
+    cx = cy = size / 2
+    outer = size * 0.38
+    inner = outer * 0.6
+
+    if not data or sum(data.values()) <= 0:
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}">'
+            f'<text x="{cx}" y="{cy}" text-anchor="middle" font-size="14">No study data yet</text>'
+            f'</svg>'
+        )
+
+    total = sum(data.values())
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size + 160}" height="{size}" '
+        f'font-family="sans-serif">',
+        f'<text x="{cx}" y="20" text-anchor="middle" font-size="15">Study Time Breakdown</text>'
+    ]
+
+    angle = -math.pi / 2  # start at 12 o'clock like startangle=90
+    for i, (label, value) in enumerate(data.items()):
+        color = COLORS[i % len(COLORS)]
+        sweep = 2 * math.pi * value / total
+        end = angle + sweep
+
+        if sweep >= 2 * math.pi - 1e-9:
+            parts.append(
+                f'<circle cx="{cx}" cy="{cy}" r="{(outer + inner) / 2:.2f}" fill="none" '
+                f'stroke="{color}" stroke-width="{outer - inner:.2f}"/>'
+            )
+        else:
+            large = 1 if sweep > math.pi else 0
+            x0, y0 = cx + outer * math.cos(angle), cy + outer * math.sin(angle)
+            x1, y1 = cx + outer * math.cos(end), cy + outer * math.sin(end)
+            x2, y2 = cx + inner * math.cos(end), cy + inner * math.sin(end)
+            x3, y3 = cx + inner * math.cos(angle), cy + inner * math.sin(angle)
+            parts.append(
+                f'<path fill="{color}" stroke="white" d="M{x0:.2f},{y0:.2f} '
+                f'A{outer:.2f},{outer:.2f} 0 {large} 1 {x1:.2f},{y1:.2f} '
+                f'L{x2:.2f},{y2:.2f} '
+                f'A{inner:.2f},{inner:.2f} 0 {large} 0 {x3:.2f},{y3:.2f} Z"/>'
+            )
+
+        mid = angle + sweep / 2
+        r = (outer + inner) / 2
+        parts.append(
+            f'<text x="{cx + r * math.cos(mid):.2f}" y="{cy + r * math.sin(mid):.2f}" '
+            f'text-anchor="middle" dominant-baseline="middle" font-size="11" fill="white">'
+            f'{value / total:.0%}</text>'
+        )
+
+        ly = 40 + i * 18
+        parts.append(
+            f'<rect x="{size}" y="{ly - 10}" width="12" height="12" fill="{color}"/>'
+            f'<text x="{size + 18}" y="{ly}" font-size="12">{html.escape(str(label))}</text>'
+        )
+        angle = end
+
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_donut_chart(renderer=None, data=None):
+    """
+    Returns the donut for the current data as HTML: a PNG <img>, or an
+    SVG string with renderer="svg". Unchanged data returns the cached chart.
+    data ({task: hours}) skips reading the sidecar again.
+    """
+    renderer = renderer or DONUT_RENDERER
+    data = get_study_hours_by_task() if data is None else dict(data)
+    key = (renderer, _data_key(data))
+
+    with _chart_lock:
+        chart = _chart_cache.get(key)
+        if chart is not None:
+            _chart_cache.move_to_end(key)
+            return chart
+
+    chart = render_donut_svg(data) if renderer == "svg" else render_donut_matplotlib(data)
+
+    with _chart_lock:
+        _chart_cache[key] = chart
+        while len(_chart_cache) > MAX_CACHED_CHARTS:
+            _chart_cache.popitem(last=False)
+    return chart
+
+
+def clear_chart_cache():
+    with _chart_lock:
+        _chart_cache.clear()
@@ -0,0 +1,50 @@
+"""
+Advisory, cross-process file locks.
+
+locked(path) holds an exclusive lock on "<path>.lock" so read-modify-write
+sequences on one file are serialised across threads and worker processes.
+Each data file has its own lock, so unrelated users never contend.
+"""
+from contextlib import contextmanager
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_held = threading.local()
+
+
+@contextmanager
+def locked(path):
+    """Exclusive lock on path; re-entrant within a thread."""
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = set()
+    if path in held:
+        yield
+        return
+
+    lock_path = path + ".lock"
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
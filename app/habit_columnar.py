@@ -0,0 +1,244 @@
+"""
+Compact columnar copy of the habit log for analytics.
+
+A store is a directory of raw little-endian column files plus metadata:
+- days.i32    date as a proleptic day ordinal (int32)
+- tasks.i16   task id, an index into meta["tasks"]; -1 for no task (int16)
+- hours.f32   hours studied (float32)
+- meta.json   row count, task dictionary, and how many bytes of which
+              JSONL log file (its inode) the columns reflect
+
+That is 10 bytes per entry instead of a dict with repeated strings, and
+the columns are loaded with numpy.memmap, so only touched pages are read.
+sync() appends just the log lines written since the last sync; convert()
+rebuilds from any iterable of entries (e.g. the legacy habit_log.json):
+
+    python habit_columnar.py convert --log habit_log.jsonl --out habit_columns
+"""
+from collections import namedtuple
+from datetime import date
+import argparse
+import json
+import os
+
+COLUMNS = {"days": ("days.i32", "<i4"), "tasks": ("tasks.i16", "<i2"), "hours": ("hours.f32", "<f4")}
+META_FILE = "meta.json"
+MAX_TASKS = 32767
+
+# days/task_ids/hours are NumPy arrays (memory-mapped when loaded from disk)
+HabitColumns = namedtuple("HabitColumns", ["days", "task_ids", "hours", "tasks"])
+
+
+def _np():
+    import numpy as np
+    return np
+
+
+def _empty_meta():
+    return {"version": 1, "count": 0, "tasks": [], "source_size": 0, "source_inode": None}
+
+
+def read_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return _empty_meta()
+
+
+def _write_meta(directory, meta):
+    # The meta file is replaced last: readers trust its count, so rows
+    # appended before a crash are simply ignored and rewritten next time
+    path = os.path.join(directory, META_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _encode(entries, meta):
+    """Entries -> column arrays, extending meta["tasks"] in place."""
+    from array import array
+
+    np = _np()
+    lookup = {name: i for i, name in enumerate(meta["tasks"])}
+    days, task_ids, hours = array("i"), array("h"), array("f")
+
+    for log in entries:
+        try:
+            day = date.fromisoformat(str(log.get("date"))[:10]).toordinal()
+        except ValueError:
+            continue
+        task = log.get("task")
+        if task:
+            tid = lookup.get(task)
+            if tid is None:
+                if len(meta["tasks"]) >= MAX_TASKS:
+                    raise ValueError(f"more than {MAX_TASKS} distinct tasks")
+                tid = lookup[task] = len(meta["tasks"])
+                meta["tasks"].append(task)
+        else:
+            tid = -1
+        days.append(day)
+        task_ids.append(tid)
+        hours.append(float(log.get("hours", 0) or 0))
+
+    return {
+        "days": np.frombuffer(days, dtype=np.int32).astype("<i4"),
+        "tasks": np.frombuffer(task_ids, dtype=np.int16).astype("<i2"),
+        "hours": np.frombuffer(hours, dtype=np.float32).astype("<f4"),
+    }
+
+
+def from_entries(entries):
+    """In-memory HabitColumns from any iterable of entries (no files)."""
+    meta = _empty_meta()
+    arrays = _encode(entries, meta)
+    return HabitColumns(arrays["days"], arrays["tasks"], arrays["hours"], meta["tasks"])
+
+
+def _append_columns(directory, meta, arrays):
+    itemsize = {name: _np().dtype(dtype).itemsize for name, (_, dtype) in COLUMNS.items()}
+    for name, (filename, _) in COLUMNS.items():
+        path = os.path.join(directory, filename)
+        mode = "r+b" if os.path.exists(path) else "wb"
+        with open(path, mode) as f:
+            # Drop rows past meta["count"] left by an interrupted append
+            f.truncate(meta["count"] * itemsize[name])
+            f.seek(0, os.SEEK_END)
+            arrays[name].tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+    meta["count"] += len(arrays["days"])
+
+
+def convert(entries, directory, source_size=0):
+    """Builds a fresh store from entries. Returns the metadata."""
+    os.makedirs(directory, exist_ok=True)
+    meta = _empty_meta()
+    for filename, _ in COLUMNS.values():
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            os.remove(path)
+    _append_columns(directory, meta, _encode(entries, meta))
+    meta["source_size"] = source_size
+    _write_meta(directory, meta)
+    return meta
+
+
+def read_tail(f, offset, size=None):
+    """
+    Parses the complete JSONL lines of binary file `f` from byte `offset`
+    (up to `size`). Returns ([(line offset, entry), ...], new offset);
+    undecodable lines are skipped, a torn last line is left for next time.
+    """
+    f.seek(offset)
+    data = f.read() if size is None else f.read(size - offset)
+    end = data.rfind(b"\n") + 1
+    rows = []
+    pos = 0
+    while pos < end:
+        nl = data.index(b"\n", pos)
+        try:
+            rows.append((offset + pos, json.loads(data[pos:nl])))
+        except ValueError:
+            pass
+        pos = nl + 1
+    return rows, offset + end
+
+
+def _jsonl_from(log_path, offset):
+    """Complete lines of the log after byte `offset`, and the new offset."""
+    with open(log_path, "rb") as f:
+        rows, offset = read_tail(f, offset)
+    return [entry for _, entry in rows], offset
+
+
+def sync(directory, log_path):
+    """
+    Brings the store up to date with the JSONL log, appending only new
+    lines. Rebuilds from scratch if the log shrank or is a different file
+    (another inode, e.g. replaced by a copy or a restore).
+    """
+    os.makedirs(directory, exist_ok=True)
+    meta = read_meta(directory)
+    try:
+        st = os.stat(log_path)
+        size, inode = st.st_size, st.st_ino
+    except FileNotFoundError:
+        size, inode = 0, None
+
+    known_inode = meta.get("source_inode")
+    if size < meta["source_size"] or (known_inode is not None and known_inode != inode):
+        meta = convert([], directory)
+    if size == meta["source_size"]:
+        return meta
+
+    entries, offset = _jsonl_from(log_path, meta["source_size"])
+    _append_columns(directory, meta, _encode(entries, meta))
+    meta["source_size"] = offset
+    meta["source_inode"] = inode
+    _write_meta(directory, meta)
+    return meta
+
+
+def load(directory):
+    """Memory-maps the store as HabitColumns (read-only)."""
+    np = _np()
+    meta = read_meta(directory)
+    count = meta["count"]
+    arrays = []
+    for filename, dtype in COLUMNS.values():
+        if count == 0:
+            arrays.append(np.empty(0, dtype=dtype))
+        else:
+            arrays.append(np.memmap(os.path.join(directory, filename), dtype=dtype,
+                                    mode="r", shape=(count,)))
+    return HabitColumns(*arrays, tasks=list(meta["tasks"]))
+
+
+def concat(stores):
+    """Merges several users' columns, re-encoding their task dictionaries."""
+    np = _np()
+    lookup = {}
+    days, task_ids, hours = [], [], []
+    for cols in stores:
+        remap = np.array([lookup.setdefault(t, len(lookup)) for t in cols.tasks] + [-1], dtype=np.int32)
+        days.append(np.asarray(cols.days))
+        # -1 indexes the trailing -1 of remap
+        task_ids.append(remap[np.asarray(cols.task_ids, dtype=np.int32)])
+        hours.append(np.asarray(cols.hours))
+    if not days:
+        return HabitColumns(np.empty(0, "<i4"), np.empty(0, np.int32), np.empty(0, "<f4"), [])
+    return HabitColumns(np.concatenate(days), np.concatenate(task_ids), np.concatenate(hours), list(lookup))
+
+
+def to_matrix(columns, end=None):
+    """analytics.HabitMatrix straight from the columns."""
+    import analytics
+
+    return analytics.from_columns(columns.days, columns.task_ids, columns.hours,
+                                  columns.tasks, end=end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert", help="build a store from habit_log.jsonl or habit_log.json")
+    conv.add_argument("--log", required=True)
+    conv.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    if args.log.endswith(".jsonl"):
+        meta = convert([], args.out)
+        meta = sync(args.out, args.log)
+    else:
+        with open(args.log, "r", encoding="utf-8") as f:
+            meta = convert(json.load(f), args.out)
+    print(f"{meta['count']} entries, {len(meta['tasks'])} tasks -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Date-sorted index over habit log entries for range queries.
+
+Entries are kept ordered by day with a running hours total, both
+overall and per task, so:
+- between(start, end, task)   is O(log n + k) via bisect
+- hours_between(start, end)   is O(log n) via prefix sums
+
+The index holds no entry dicts, only parallel arrays of day ordinal,
+hours and a row reference (for LogIndex, the line's byte offset in the
+log), about 60 bytes per entry; between() returns references and
+LogIndex reads just those k lines back from the file.
+
+Appends in date order are O(1). An entry dated before the newest one
+(back-filled sessions) is inserted in place, and the prefix sums are
+recomputed lazily from that point on the next aggregate query.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+import json
+import os
+import threading
+
+from habit_columnar import read_tail
+
+
+def _day(value):
+    """Proleptic ordinal for a date or "YYYY-MM-DD..." string."""
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class _SortedSeries:
+    def __init__(self):
+        self.days = array("i")
+        self.refs = array("q")
+        self.hours = array("d")
+        self.prefix = array("d", [0.0])  # prefix[i] = hours of rows[:i], valid up to len(prefix)-1
+
+    def add(self, day, ref, hours):
+        if not self.days or day >= self.days[-1]:
+            self.days.append(day)
+            self.refs.append(ref)
+            self.hours.append(hours)
+            return
+        # Out of order: insert after rows with the same day
+        pos = bisect_right(self.days, day)
+        self.days.insert(pos, day)
+        self.refs.insert(pos, ref)
+        self.hours.insert(pos, hours)
+        del self.prefix[pos + 1:]
+
+    def extend(self, rows):
+        """Adds (day, ref, hours) rows; large unordered batches are merged in one sort."""
+        in_order = all(a[0] <= b[0] for a, b in zip(rows, rows[1:])) and (
+            not self.days or not rows or rows[0][0] >= self.days[-1]
+        )
+        if in_order or len(rows) <= 32:
+            for row in rows:
+                self.add(*row)
+            return
+        # Stable sort (the existing run is already sorted) keeps the log
+        # order of rows with the same day
+        merged = sorted(list(zip(self.days, self.refs, self.hours)) + list(rows), key=lambda r: r[0])
+        self.days = array("i", (r[0] for r in merged))
+        self.refs = array("q", (r[1] for r in merged))
+        self.hours = array("d", (r[2] for r in merged))
+        self.prefix = array("d", [0.0])
+
+    def _prefix_to(self, n):
+        prefix = self.prefix
+        for i in range(len(prefix) - 1, n):
+            prefix.append(prefix[-1] + self.hours[i])
+        return prefix
+
+    def span(self, start, end):
+        return bisect_left(self.days, start), bisect_right(self.days, end)
+
+    def hours_in(self, start, end):
+        lo, hi = self.span(start, end)
+        prefix = self._prefix_to(hi)
+        return prefix[hi] - prefix[lo]
+
+
+class HabitIndex:
+    """
+    Index of (ref, entry) pairs. Only the entry's date, task and hours
+    are kept; between() returns the refs of the matching entries.
+    """
+
+    def __init__(self):
+        self.all = _SortedSeries()
+        self.by_task = {}
+
+    def __len__(self):
+        return len(self.all.days)
+
+    def add(self, ref, entry):
+        self.extend([(ref, entry)])
+
+    def extend(self, pairs):
+        rows = []
+        per_task = {}
+        for ref, entry in pairs:
+            try:
+                day = _day(entry.get("date"))
+            except ValueError:
+                continue
+            row = (day, ref, float(entry.get("hours", 0) or 0))
+            rows.append(row)
+            task = entry.get("task")
+            if task:
+                per_task.setdefault(task, []).append(row)
+        self.all.extend(rows)
+        for task, task_rows in per_task.items():
+            series = self.by_task.get(task)
+            if series is None:
+                series = self.by_task[task] = _SortedSeries()
+            series.extend(task_rows)
+
+    def _series(self, task):
+        return self.all if task is None else self.by_task.get(task)
+
+    def between(self, start, end, task=None):
+        """Refs of entries with start <= date <= end, in date order."""
+        series = self._series(task)
+        if series is None:
+            return []
+        lo, hi = series.span(_day(start), _day(end))
+        return series.refs[lo:hi].tolist()
+
+    def hours_between(self, start, end, task=None):
+        series = self._series(task)
+        return round(series.hours_in(_day(start), _day(end)), 4) if series else 0
+
+    def task_hours_between(self, start, end):
+        """{task: hours} over the range, one O(log n) lookup per task."""
+        start, end = _day(start), _day(end)
+        totals = {}
+        for task, series in self.by_task.items():
+            hours = series.hours_in(start, end)
+            if hours:
+                totals[task] = round(hours, 4)
+        return totals
+
+
+class LogIndex:
+    """
+    A HabitIndex over a JSONL log file, keyed by line offset, extended
+    with the lines appended since the previous query and rebuilt if the
+    file was replaced. Queries are serialised with refreshes and read
+    rows from the same open file, so results are consistent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = HabitIndex()
+        self.offset = 0
+        self.inode = None
+        self._lock = threading.Lock()
+
+    def _reset(self, inode=None):
+        self.index, self.offset, self.inode = HabitIndex(), 0, inode
+
+    def _refresh(self, f):
+        st = os.fstat(f.fileno())
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            self._reset(st.st_ino)
+        if st.st_size == self.offset:
+            return
+        rows, self.offset = read_tail(f, self.offset, st.st_size)
+        self.index.extend(rows)
+
+    def _query(self, method, *args, read_rows=False):
+        with self._lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                self._reset()
+                return getattr(self.index, method)(*args)
+            with f:
+                self._refresh(f)
+                result = getattr(self.index, method)(*args)
+                if read_rows:
+                    result = self._read_rows(f, result)
+            return result
+
+    @staticmethod
+    def _read_rows(f, offsets):
+        rows = []
+        for offset in offsets:
+            f.seek(offset)
+            rows.append(json.loads(f.readline()))
+        return rows
+
+    def between(self, start, end, task=None):
+        return self._query("between", start, end, task, read_rows=True)
+
+    def hours_between(self, start, end, task=None):
+        return self._query("hours_between", start, end, task)
+
+    def task_hours_between(self, start, end):
+        return self._query("task_hours_between", start, end)
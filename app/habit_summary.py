@@ -0,0 +1,136 @@
+"""
+Local pre-aggregation of the habit log for the insights / summary prompts.
+
+Instead of sending every raw log entry, the prompts get a compact table
+of per-day and per-task rollups for a date window, capped to a token budget.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+# Rough size of the data section sent to the model (~4 characters per token)
+PROMPT_TOKEN_BUDGET = 600
+CHARS_PER_TOKEN = 4
+
+
+def window_for(days, end=None):
+    """Returns (start, end) dates covering the last `days` days up to `end`."""
+    end = end or date.today()
+    return end - timedelta(days=days - 1), end
+
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def summarise_habits(logs, start, end):
+    """
+    Rolls up habit log entries between start and end (inclusive).
+    `logs` can be any iterable of entries, e.g. iter_habit_data().
+    """
+    daily = defaultdict(float)
+    task_first = defaultdict(float)
+    task_second = defaultdict(float)
+
+    span = (end - start).days + 1
+    midpoint = start + timedelta(days=span // 2)
+
+    for log in logs:
+        day = _parse_day(log.get("date"))
+        if day is None or day < start or day > end:
+            continue
+        hours = log.get("hours", 0) or 0
+        daily[day] += hours
+
+        task = log.get("task") or "(untitled)"
+        if day < midpoint:
+            task_first[task] += hours
+        else:
+            task_second[task] += hours
+
+    days = [start + timedelta(days=i) for i in range(span)]
+    per_day = [(d, round(daily.get(d, 0), 2)) for d in days]
+
+    tasks = {}
+    for task in set(task_first) | set(task_second):
+        first, second = task_first[task], task_second[task]
+        tasks[task] = {
+            "hours": round(first + second, 2),
+            "trend": round(second - first, 2)  # later half minus earlier half
+        }
+
+    total = round(sum(daily.values()), 2)
+    active = [(d, h) for d, h in per_day if h > 0]
+    first_half = sum(h for d, h in per_day if d < midpoint)
+    second_half = sum(h for d, h in per_day if d >= midpoint)
+
+    return {
+        "start": start,
+        "end": end,
+        "total_hours": total,
+        "active_days": len(active),
+        "days_in_window": span,
+        "average_per_day": round(total / span, 2),
+        "best_day": max(per_day, key=lambda x: x[1]) if active else None,
+        "worst_day": min(per_day, key=lambda x: x[1]) if active else None,
+        "trend": round(second_half - first_half, 2),
+        "per_day": per_day,
+        "tasks": tasks,
+    }
+
+
+def _day_label(entry):
+    d, h = entry
+    return f"{d.isoformat()} ({d.strftime('%a')}) {h}h"
+
+
+def format_summary(summary, token_budget=PROMPT_TOKEN_BUDGET):
+    """
+    Renders a summary as a compact text table for a prompt.
+    Per-day rows are dropped first, then the smallest tasks,
+    so the result stays within token_budget.
+    """
+    head = [
+        f"Window: {summary['start'].isoformat()} to {summary['end'].isoformat()} "
+        f"({summary['days_in_window']} days)",
+        f"Total hours: {summary['total_hours']}",
+        f"Days studied: {summary['active_days']}/{summary['days_in_window']}",
+        f"Average per day: {summary['average_per_day']}h",
+        f"Trend (second half minus first half): {summary['trend']:+}h",
+    ]
+    if summary["best_day"]:
+        head.append(f"Best day: {_day_label(summary['best_day'])}")
+        head.append(f"Worst day: {_day_label(summary['worst_day'])}")
+
+    tasks = sorted(summary["tasks"].items(), key=lambda x: -x[1]["hours"])
+    task_lines = [f"{t}: {v['hours']}h (trend {v['trend']:+}h)" for t, v in tasks]
+    day_lines = [f"{d.isoformat()} {d.strftime('%a')}: {h}h" for d, h in summary["per_day"]]
+
+    max_chars = token_budget * CHARS_PER_TOKEN
+
+    def render(task_rows, day_rows):
+        parts = head + ["", "Hours per task:"] + (task_rows or ["(none)"])
+        if day_rows:
+            parts += ["", "Hours per day:"] + day_rows
+        return "\n".join(parts)
+
+    text = render(task_lines, day_lines)
+    if len(text) <= max_chars:
+        return text
+
+    text = render(task_lines, [])
+    if len(text) <= max_chars:
+        return text
+
+    # Keep the largest tasks that fit, leaving room for the "omitted" line
+    used = len(render([], [])) + 60
+    kept = []
+    for line in task_lines:
+        used += len(line) + 1
+        if used > max_chars:
+            break
+        kept.append(line)
+    kept.append(f"... {len(task_lines) - len(kept)} smaller tasks omitted")
+    return render(kept, [])[:max_chars]
@@ -0,0 +1,141 @@
+"""
+Disk cache for LLM chat completions.
+
+Each response is stored as one JSON file under .llm_cache/, named by a
+hash of model + messages. Entries expire after a per-endpoint TTL and the
+least recently used ones are evicted once the cache is over its size limit.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(BASE_DIR, ".llm_cache"))
+
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+# Seconds a cached response stays fresh, per endpoint.
+# 0 disables caching for that endpoint (quotes should vary).
+ENDPOINT_TTL = {
+    "plan": 24 * 60 * 60,
+    "insights": 15 * 60,
+    "summary": 60 * 60,
+    "quote": 0,
+}
+
+_evict_lock = threading.Lock()
+
+
+def cache_bypassed():
+    """LLM_CACHE_BYPASS=1 turns the cache off for the whole process."""
+    return os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+
+
+def ttl_for(endpoint):
+    return ENDPOINT_TTL.get(endpoint, 0)
+
+
+def make_key(model, messages, options=None):
+    payload = json.dumps(
+        {"model": model, "messages": messages, "options": options or {}},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, key + ".json")
+
+
+def get(endpoint, key, allow_stale=False):
+    """
+    Returns the cached content, or None when missing or expired.
+    allow_stale=True ignores the TTL (fallback when the API is down).
+    A hit refreshes the entry's mtime, which is what LRU eviction uses.
+    """
+    ttl = ttl_for(endpoint)
+    if ttl <= 0:
+        return None
+
+    path = _entry_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not allow_stale and time.time() - entry.get("created", 0) > ttl:
+        return None
+
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry.get("content")
+
+
+def put(endpoint, key, content):
+    if ttl_for(endpoint) <= 0 or content is None:
+        return
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "endpoint": endpoint,
+            "created": time.time(),
+            "content": content
+        }, f)
+    os.replace(tmp_path, path)
+
+    evict()
+
+
+def evict():
+    """Removes least recently used entries until under both limits."""
+    with _evict_lock:
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(CACHE_DIR)
+        except FileNotFoundError:
+            return
+
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        entries.sort()
+        count = len(entries)
+        for _, size, path in entries:
+            if count <= MAX_ENTRIES and total <= MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            count -= 1
+            total -= size
+
+
+def clear():
+    try:
+        names = os.listdir(CACHE_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except OSError:
+            pass
@@ -0,0 +1,203 @@
+"""
+Pluggable LLM client layer.
+
+The backend talks to a client with two methods:
+- complete(model, messages, timeout=None, **options) -> ChatResult(text, usage)
+- stream(model, messages, timeout=None, **options)   -> iterator of text deltas,
+  whose return value (StopIteration.value) is the usage dict
+
+timeout is a per-request limit in seconds; retries are left to
+llm_resilience, so the SDK's own retries are turned off.
+
+LLM_BACKEND selects the implementation:
+- "openai" (default): the real OpenAI API
+- "stub":   an OpenAI-compatible stand-in server (stub_server.py) at LLM_STUB_URL
+- "record": the real API, writing every exchange to the LLM_CASSETTE file
+- "replay": answers only from LLM_CASSETTE, never touches the network
+"""
+from collections import namedtuple
+import json
+import os
+import threading
+
+import llm_cache
+
+MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CASSETTE = os.path.join(BASE_DIR, "llm_cassette.jsonl")
+DEFAULT_STUB_URL = "http://127.0.0.1:8765/v1"
+
+# usage is a dict with prompt_tokens / completion_tokens / total_tokens (may be empty)
+ChatResult = namedtuple("ChatResult", ["text", "usage"])
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def _usage_dict(usage):
+    if not usage:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+    }
+
+
+class OpenAIChatClient:
+    """Wraps the openai SDK. base_url points it at the stand-in server."""
+
+    def __init__(self, api_key=None, base_url=None):
+        from openai import OpenAI
+
+        self._client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+    def complete(self, model, messages, timeout=None, **options):
+        response = self._client.chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout,
+            **options
+        )
+        return ChatResult(
+            response.choices[0].message.content,
+            _usage_dict(getattr(response, "usage", None))
+        )
+
+    def stream(self, model, messages, timeout=None, **options):
+        options.setdefault("stream_options", {"include_usage": True})
+        stream = self._client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            timeout=timeout,
+            **options
+        )
+        usage = {}
+        for chunk in stream:
+            # With include_usage the last chunk has no choices, only usage
+            if getattr(chunk, "usage", None):
+                usage = _usage_dict(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+        return usage
+
+
+class CassetteClient:
+    """
+    Record/replay client. With `inner`, forwards each request and appends
+    the exchange to the cassette (JSONL). Without it, replays recorded
+    replies keyed on model + messages + options.
+    """
+
+    def __init__(self, path, inner=None):
+        self.path = path
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._tapes = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._tapes[entry["key"]] = entry
+
+    def _record(self, key, model, messages, options, text, usage):
+        entry = {
+            "key": key,
+            "model": model,
+            "messages": messages,
+            "options": options,
+            "text": text,
+            "usage": usage
+        }
+        with self._lock:
+            self._tapes[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def _replay(self, key):
+        entry = self._tapes.get(key)
+        if entry is None:
+            raise CassetteMiss(f"no recorded reply for request {key[:12]}")
+        return entry
+
+    def complete(self, model, messages, timeout=None, **options):
+        key = llm_cache.make_key(model, messages, options)
+        if self.inner is None:
+            entry = self._replay(key)
+            return ChatResult(entry["text"], entry.get("usage", {}))
+
+        result = self.inner.complete(model, messages, timeout=timeout, **options)
+        self._record(key, model, messages, options, result.text, result.usage)
+        return result
+
+    def stream(self, model, messages, timeout=None, **options):
+        key = llm_cache.make_key(model, messages, options)
+        if self.inner is None:
+            entry = self._replay(key)
+            # Replay word by word so streaming handlers behave as live
+            for i, word in enumerate(entry["text"].split(" ")):
+                yield word if i == 0 else " " + word
+            return entry.get("usage", {})
+
+        parts = []
+        deltas = self.inner.stream(model, messages, timeout=timeout, **options)
+        while True:
+            try:
+                delta = next(deltas)
+            except StopIteration as stop:
+                usage = stop.value or {}
+                break
+            parts.append(delta)
+            yield delta
+        self._record(key, model, messages, options, "".join(parts), usage)
+        return usage
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def create_client(backend=None):
+    # .env (OPENAI_API_KEY etc.) is read on first use, not at import
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    backend = backend or os.getenv("LLM_BACKEND", "openai")
+    cassette = os.getenv("LLM_CASSETTE", DEFAULT_CASSETTE)
+
+    if backend == "openai":
+        return OpenAIChatClient(api_key=os.getenv("OPENAI_API_KEY"))
+    if backend == "stub":
+        return OpenAIChatClient(
+            api_key="stub",
+            base_url=os.getenv("LLM_STUB_URL", DEFAULT_STUB_URL)
+        )
+    if backend == "record":
+        return CassetteClient(cassette, inner=OpenAIChatClient(api_key=os.getenv("OPENAI_API_KEY")))
+    if backend == "replay":
+        return CassetteClient(cassette)
+    raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+
+
+def get_client():
+    """Returns the process-wide client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client()
+    return _client
+
+
+def set_client(client):
+    """Swaps the process-wide client (benchmarks, load tests)."""
+    global _client
+    _client = client
@@ -0,0 +1,99 @@
+"""
+Bounded worker pools for LLM calls, with single-flight deduplication.
+
+Each endpoint (plan, insights, summary, quote) has its own thread pool,
+so a burst on one button cannot starve the others. Identical requests
+(same cache key) that are already in flight share one upstream call:
+N waiters, one request.
+
+Pool sizes can be overridden with LLM_CONCURRENCY_<ENDPOINT>, e.g.
+LLM_CONCURRENCY_PLAN=8.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+import threading
+
+DEFAULT_CONCURRENCY = {
+    "plan": 4,
+    "insights": 2,
+    "summary": 2,
+    "quote": 1,
+}
+FALLBACK_CONCURRENCY = 2
+
+_executors = {}
+_semaphores = {}
+_inflight = {}  # request key -> Future
+_lock = threading.Lock()
+_stats = {"submitted": 0, "coalesced": 0}
+
+
+def concurrency_for(endpoint):
+    default = DEFAULT_CONCURRENCY.get(endpoint, FALLBACK_CONCURRENCY)
+    return int(os.getenv(f"LLM_CONCURRENCY_{endpoint.upper()}", default))
+
+
+def _executor(endpoint):
+    executor = _executors.get(endpoint)
+    if executor is None:
+        executor = _executors[endpoint] = ThreadPoolExecutor(
+            max_workers=concurrency_for(endpoint),
+            thread_name_prefix=f"llm-{endpoint}"
+        )
+    return executor
+
+
+def submit(endpoint, key, fn):
+    """
+    Runs fn() on the endpoint's pool and returns its Future. If a call
+    with the same key is still running, its Future is returned instead.
+    """
+    with _lock:
+        future = _inflight.get(key)
+        if future is not None:
+            _stats["coalesced"] += 1
+            return future
+
+        _stats["submitted"] += 1
+        future = _executor(endpoint).submit(fn)
+        _inflight[key] = future
+
+    def _done(f):
+        with _lock:
+            if _inflight.get(key) is f:
+                del _inflight[key]
+
+    future.add_done_callback(_done)
+    return future
+
+
+def run(endpoint, key, fn, timeout=None):
+    """submit() and wait for the result."""
+    return submit(endpoint, key, fn).result(timeout=timeout)
+
+
+@contextmanager
+def stream_slot(endpoint, timeout=None):
+    """
+    Limits concurrent streams per endpoint. Streams are not coalesced:
+    each caller consumes its own token stream. Raises TimeoutError if
+    no slot frees up within `timeout` seconds.
+    """
+    with _lock:
+        semaphore = _semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = _semaphores[endpoint] = threading.BoundedSemaphore(
+                concurrency_for(endpoint)
+            )
+    if not semaphore.acquire(timeout=timeout):
+        raise TimeoutError(f"{endpoint}: no free stream slot after {timeout}s")
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def get_stats():
+    with _lock:
+        return {**_stats, "inflight": len(_inflight)}
@@ -0,0 +1,264 @@
+"""
+Tail-latency controls for LLM calls.
+
+call(endpoint, attempt) wraps one logical request with:
+- a per-endpoint deadline covering every attempt,
+- bounded retries with exponential backoff and full jitter,
+- an optional hedged second request once the attempt has taken longer
+  than the endpoint's recent p95 latency,
+- a circuit breaker that fails fast after repeated failures.
+
+stream(endpoint, open_stream) applies the same deadline and retries to
+streamed replies, up to the first token.
+
+All of it can be exercised offline against stub_server.py
+(--latency / --jitter / --error-rate).
+"""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import os
+import random
+import threading
+import time
+
+# deadline: seconds for the whole call; attempt_timeout: per request
+POLICIES = {
+    "plan": {"deadline": 90, "attempt_timeout": 45, "retries": 2, "hedge": False},
+    "insights": {"deadline": 30, "attempt_timeout": 15, "retries": 2, "hedge": True},
+    "summary": {"deadline": 45, "attempt_timeout": 20, "retries": 2, "hedge": True},
+    "quote": {"deadline": 15, "attempt_timeout": 8, "retries": 1, "hedge": True},
+}
+DEFAULT_POLICY = {"deadline": 30, "attempt_timeout": 15, "retries": 1, "hedge": False}
+
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "1") == "1"
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+BREAKER_FAILURES = 5     # consecutive failures that open the circuit
+BREAKER_RESET = 30.0     # seconds before a half-open trial request
+
+_RETRYABLE_STATUS = {408, 409, 429}
+_RETRYABLE_NAMES = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"}
+
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+class LLMUnavailable(RuntimeError):
+    """The call failed and there was nothing to fall back on."""
+
+
+class CircuitOpenError(LLMUnavailable):
+    """Raised without calling upstream while the circuit is open."""
+
+
+def policy_for(endpoint):
+    return POLICIES.get(endpoint, DEFAULT_POLICY)
+
+
+def is_retryable(exc):
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if type(exc).__name__ in _RETRYABLE_NAMES:
+        return True
+    status = getattr(exc, "status_code", None)
+    return status in _RETRYABLE_STATUS or (status is not None and status >= 500)
+
+
+# ------------------------------------------------------------
+# CIRCUIT BREAKER
+# ------------------------------------------------------------
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.failures_to_open = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failures_to_open:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_latencies = {}
+_registry_lock = threading.Lock()
+
+
+def breaker(endpoint):
+    with _registry_lock:
+        b = _breakers.get(endpoint)
+        if b is None:
+            b = _breakers[endpoint] = CircuitBreaker()
+        return b
+
+
+def _record_latency(endpoint, seconds):
+    with _registry_lock:
+        samples = _latencies.get(endpoint)
+        if samples is None:
+            samples = _latencies[endpoint] = deque(maxlen=LATENCY_WINDOW)
+        samples.append(seconds)
+
+
+def latency_p95(endpoint):
+    """p95 of recent successful attempts, or None until enough samples."""
+    with _registry_lock:
+        samples = sorted(_latencies.get(endpoint, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[int(0.95 * (len(samples) - 1))]
+
+
+# ------------------------------------------------------------
+# CALLS
+# ------------------------------------------------------------
+def _timed(endpoint, attempt, timeout):
+    start = time.monotonic()
+    result = attempt(timeout)
+    _record_latency(endpoint, time.monotonic() - start)
+    return result
+
+
+def _attempt_with_hedge(endpoint, attempt, timeout):
+    """
+    Runs one attempt; if it is still running after the p95 latency,
+    fires an identical second request and returns whichever finishes first.
+    """
+    p95 = latency_p95(endpoint) if HEDGING_ENABLED and policy_for(endpoint)["hedge"] else None
+    if p95 is None or p95 >= timeout:
+        return _timed(endpoint, attempt, timeout)
+
+    first = _hedge_pool.submit(_timed, endpoint, attempt, timeout)
+    done, _ = wait([first], timeout=p95)
+    if done:
+        return first.result()
+
+    second = _hedge_pool.submit(_timed, endpoint, attempt, max(timeout - p95, 0.1))
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for f in done:
+            if f.exception() is None:
+                return f.result()
+            error = f.exception()
+    raise error or TimeoutError(f"{endpoint}: hedged attempts timed out")
+
+
+def _backoff(retry):
+    """Full-jitter exponential backoff before retry number `retry` + 1."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** retry))
+
+
+def call(endpoint, attempt):
+    """
+    Runs attempt(timeout) -> result under the endpoint's policy.
+    Raises CircuitOpenError while the circuit is open, otherwise the
+    last error once retries or the deadline are used up.
+    """
+    policy = policy_for(endpoint)
+    b = breaker(endpoint)
+    if not b.allow():
+        raise CircuitOpenError(f"{endpoint}: circuit open, failing fast")
+
+    deadline = time.monotonic() + policy["deadline"]
+    last_error = None
+
+    for retry in range(policy["retries"] + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            result = _attempt_with_hedge(endpoint, attempt, min(policy["attempt_timeout"], remaining))
+        except Exception as e:
+            last_error = e
+            if not is_retryable(e):
+                break
+            backoff = _backoff(retry)
+            if time.monotonic() + backoff >= deadline:
+                break
+            time.sleep(backoff)
+            continue
+
+        b.record_success()
+        return result
+
+    b.record_failure()
+    raise last_error or TimeoutError(f"{endpoint}: deadline exceeded")
+
+
+def stream_guard(endpoint):
+    """Breaker check for streamed calls, which cannot be retried mid-stream."""
+    b = breaker(endpoint)
+    if not b.allow():
+        raise CircuitOpenError(f"{endpoint}: circuit open, failing fast")
+    return b
+
+
+def stream(endpoint, open_stream):
+    """
+    Yields the deltas of open_stream(timeout) under the endpoint's policy.
+    Failures before the first delta are retried with backoff like call();
+    once a delta has been yielded they are raised. The whole stream must
+    finish within the deadline, otherwise TimeoutError is raised.
+    """
+    policy = policy_for(endpoint)
+    deadline = time.monotonic() + policy["deadline"]
+
+    for retry in range(policy["retries"] + 1):
+        started = False
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{endpoint}: deadline exceeded")
+            for delta in open_stream(min(policy["attempt_timeout"], remaining)):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{endpoint}: stream deadline exceeded")
+                started = True
+                yield delta
+            return
+        except Exception as e:
+            if started or retry == policy["retries"] or not is_retryable(e):
+                raise
+            backoff = _backoff(retry)
+            if time.monotonic() + backoff >= deadline:
+                raise
+            time.sleep(backoff)
+
+
+def get_state():
+    with _registry_lock:
+        names = set(_breakers) | set(_latencies)
+    return {
+        name: {"circuit": breaker(name).state, "p95_s": latency_p95(name)}
+        for name in sorted(names)
+    }
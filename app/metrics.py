@@ -0,0 +1,193 @@
+"""
+In-process metrics with a Prometheus text endpoint.
+
+- instrument(): latency histograms for Gradio handlers and backend functions
+- record_io(): bytes and seconds spent on file reads/writes, per file kind
+- record_llm(): requests and usage tokens per LLM endpoint
+
+start_server() serves everything at http://<host>:<port>/metrics from a
+daemon thread (SENSEFLOW_METRICS_PORT, default 9464; 0 turns it off).
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("SENSEFLOW_METRICS_PORT", "9464"))
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+# name -> {label tuple: [bucket counts..., sum, count]}
+_histograms = {}
+# name -> {label tuple: value}
+_counters = {}
+
+_HELP = {
+    "senseflow_handler_seconds": ("histogram", "Gradio handler latency"),
+    "senseflow_function_seconds": ("histogram", "Backend function latency"),
+    "senseflow_file_io_bytes_total": ("counter", "Bytes read or written, per file kind"),
+    "senseflow_file_io_seconds_total": ("counter", "Seconds spent in file reads or writes"),
+    "senseflow_llm_requests_total": ("counter", "LLM API requests, per endpoint"),
+    "senseflow_llm_tokens_total": ("counter", "LLM usage tokens, per endpoint and kind"),
+}
+
+
+def observe(name, labels, seconds):
+    """Adds one sample to a histogram. labels is a tuple of (key, value)."""
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        row = series.get(labels)
+        if row is None:
+            row = series[labels] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                row[i] += 1
+        row[-2] += seconds
+        row[-1] += 1
+
+
+def inc(name, labels, value=1):
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+
+# ------------------------------------------------------------
+# INSTRUMENTATION
+# ------------------------------------------------------------
+def instrument(name=None, kind="function"):
+    """
+    Decorator recording call latency into senseflow_<kind>_seconds.
+    Generator functions are timed from the first call until they finish,
+    which for streaming handlers is the full response time.
+    """
+    def decorate(fn):
+        metric = f"senseflow_{kind}_seconds"
+        labels = ((kind, name or fn.__name__),)
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    yield from fn(*args, **kwargs)
+                finally:
+                    observe(metric, labels, time.perf_counter() - start)
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(metric, labels, time.perf_counter() - start)
+        return wrapper
+
+    return decorate
+
+
+def target_for(path):
+    """Bounded label for a file: its name, or "calendar" for week files."""
+    parent = os.path.basename(os.path.dirname(path))
+    return "calendar" if parent == "calendar" else os.path.basename(path)
+
+
+def record_io(path, op, nbytes, seconds):
+    labels = (("file", target_for(path)), ("op", op))
+    inc("senseflow_file_io_bytes_total", labels, nbytes)
+    inc("senseflow_file_io_seconds_total", labels, seconds)
+
+
+def record_llm(endpoint, usage):
+    """Counts one API request and its usage tokens (usage may be empty)."""
+    inc("senseflow_llm_requests_total", (("endpoint", endpoint),))
+    for kind in ("prompt_tokens", "completion_tokens"):
+        tokens = (usage or {}).get(kind)
+        if tokens:
+            inc("senseflow_llm_tokens_total",
+                (("endpoint", endpoint), ("kind", kind.split("_")[0])), tokens)
+
+
+# ------------------------------------------------------------
+# EXPOSITION
+# ------------------------------------------------------------
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def render():
+    """Current values in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {n: {k: list(v) for k, v in s.items()} for n, s in _histograms.items()}
+        counters = {n: dict(s) for n, s in _counters.items()}
+
+    lines = []
+    for name in sorted(histograms):
+        kind, text = _HELP.get(name, ("histogram", name))
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        for labels, row in sorted(histograms[name].items()):
+            for bound, count in zip(BUCKETS, row):
+                lines.append(f"{name}_bucket{_label_text(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_label_text(labels, [('le', '+Inf')])} {row[-1]}")
+            lines.append(f"{name}_sum{_label_text(labels)} {row[-2]:.6f}")
+            lines.append(f"{name}_count{_label_text(labels)} {row[-1]}")
+
+    for name in sorted(counters):
+        kind, text = _HELP.get(name, ("counter", name))
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        for labels, value in sorted(counters[name].items()):
+            lines.append(f"{name}{_label_text(labels)} {value:g}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=None, host="127.0.0.1"):
+    """
+    Serves /metrics on a daemon thread. Returns the server, or None if
+    disabled or the port is taken (e.g. by another worker process).
+    """
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
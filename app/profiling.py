@@ -0,0 +1,242 @@
+"""
+On-demand profiling of Gradio event handlers.
+
+Handlers wrapped with profiled() run untouched until profiling is armed
+for them, either at start-up:
+
+    SENSEFLOW_PROFILE=prepare_plan:3,load_dashboard:1 python app.py
+
+or at run time by sending SIGUSR1, which arms SENSEFLOW_PROFILE_ON_SIGNAL
+(default "*:5", the next five calls of any handler). Each armed call is
+written to SENSEFLOW_PROFILE_DIR (default app/profiles) as:
+- <handler>-<time>.pstats   cProfile output (SENSEFLOW_PROFILE_MODE=cprofile)
+- <handler>-<time>.folded   sampled collapsed stacks for flamegraph.pl or
+                            speedscope (SENSEFLOW_PROFILE_MODE=sample)
+"""
+import cProfile
+import functools
+import inspect
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.getenv("SENSEFLOW_PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_MODE = os.getenv("SENSEFLOW_PROFILE_MODE", "cprofile")
+SIGNAL_SPEC = os.getenv("SENSEFLOW_PROFILE_ON_SIGNAL", "*:5")
+SAMPLE_INTERVAL = float(os.getenv("SENSEFLOW_PROFILE_INTERVAL", "0.005"))
+
+# handler name (or "*") -> calls left to profile
+_remaining = {}
+# Checked first on every call, so unarmed handlers cost one global read
+_armed = False
+_lock = threading.Lock()
+# Only one cProfile profiler can be active at a time
+_profiler_busy = threading.Lock()
+# Set while a profiled handler runs, so handlers it calls are not claimed too
+_local = threading.local()
+
+
+def parse_spec(spec):
+    """"name:N,other:M" -> {"name": N, "other": M}; a bare name means 1."""
+    counts = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, n = part.partition(":")
+        counts[name.strip()] = int(n) if n.strip() else 1
+    return counts
+
+
+def arm(spec):
+    """Profiles the next N calls of each handler named in spec."""
+    global _armed
+    with _lock:
+        for name, n in parse_spec(spec).items():
+            _remaining[name] = _remaining.get(name, 0) + n
+        _armed = any(_remaining.values())
+    logger.warning("Profiling armed: %s", dict(_remaining))
+
+
+def disarm():
+    global _armed
+    with _lock:
+        _remaining.clear()
+        _armed = False
+
+
+def _claim(name):
+    """True if this call of `name` should be profiled (uses up one count)."""
+    global _armed
+    if getattr(_local, "active", False):
+        return False
+    with _lock:
+        for key in (name, "*"):
+            if _remaining.get(key, 0) > 0:
+                _remaining[key] -= 1
+                _armed = any(_remaining.values())
+                return True
+    return False
+
+
+def install_signal_handler(signum=None):
+    """SIGUSR1 arms SIGNAL_SPEC. No-op where the signal does not exist."""
+    signum = signum or getattr(signal, "SIGUSR1", None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signum, lambda *_: arm(SIGNAL_SPEC))
+    return True
+
+
+def _output_path(name, suffix):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(PROFILE_DIR, f"{name}-{stamp}-{time.monotonic_ns() % 10**6}.{suffix}")
+
+
+# ------------------------------------------------------------
+# PROFILERS
+# ------------------------------------------------------------
+class _CProfileRun:
+    """cProfile enabled only while the handler's own code runs."""
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = None
+
+    def start(self):
+        if not _profiler_busy.acquire(blocking=False):
+            return False
+        self.profile = cProfile.Profile()
+        return True
+
+    def step(self, fn, *args):
+        _local.active = True
+        self.profile.enable()
+        try:
+            return fn(*args)
+        finally:
+            self.profile.disable()
+            _local.active = False
+
+    def finish(self):
+        try:
+            path = _output_path(self.name, "pstats")
+            self.profile.dump_stats(path)
+            logger.warning("Profile of %s written to %s", self.name, path)
+        finally:
+            _profiler_busy.release()
+
+
+class _SamplingRun:
+    """Samples the handler's thread stack every SAMPLE_INTERVAL seconds."""
+
+    def __init__(self, name):
+        self.name = name
+        self.stacks = {}
+        self.thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        return True
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id) if self.thread_id else None
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            key = ";".join(reversed(names))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def step(self, fn, *args):
+        # Generator steps may run on different worker threads
+        self.thread_id = threading.get_ident()
+        _local.active = True
+        try:
+            return fn(*args)
+        finally:
+            self.thread_id = None
+            _local.active = False
+
+    def finish(self):
+        self._stop.set()
+        self._sampler.join()
+        path = _output_path(self.name, "folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        logger.warning("Sampled profile of %s written to %s", self.name, path)
+
+
+def _new_run(name):
+    run = _SamplingRun(name) if PROFILE_MODE == "sample" else _CProfileRun(name)
+    return run if run.start() else None
+
+
+# ------------------------------------------------------------
+# DECORATOR
+# ------------------------------------------------------------
+def profiled(name=None):
+    """
+    Decorator for event handlers. Costs one flag check per call unless
+    profiling has been armed; generator handlers are profiled across
+    all of their steps.
+    """
+    def decorate(fn):
+        label = name or fn.__name__
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                if not (_armed and _claim(label)):
+                    yield from fn(*args, **kwargs)
+                    return
+                run = _new_run(label)
+                if run is None:
+                    yield from fn(*args, **kwargs)
+                    return
+                gen = fn(*args, **kwargs)
+                try:
+                    while True:
+                        try:
+                            value = run.step(next, gen)
+                        except StopIteration:
+                            return
+                        yield value
+                finally:
+                    gen.close()
+                    run.finish()
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not (_armed and _claim(label)):
+                return fn(*args, **kwargs)
+            run = _new_run(label)
+            if run is None:
+                return fn(*args, **kwargs)
+            try:
+                return run.step(functools.partial(fn, *args, **kwargs))
+            finally:
+                run.finish()
+        return wrapper
+
+    return decorate
+
+
+if os.getenv("SENSEFLOW_PROFILE"):
+    arm(os.getenv("SENSEFLOW_PROFILE"))
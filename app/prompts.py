@@ -34,6 +34,38 @@ Format the output clearly using headings and bullet points.
 """
 
 
+# ------------------------------------------------------------
+# STUDY PLAN GENERATOR PROMPT (STRUCTURED JSON MODE)
+# ------------------------------------------------------------
+# The markdown shown to the user is rendered locally from this JSON.
+STUDY_PLAN_JSON_PROMPT = """
+You are an AI study coach helping a user plan their study time for the day.
+
+Here is the information provided:
+- Tasks to complete: {tasks}
+- Available study time: {hours} hours
+- Difficulty preference: {difficulty}
+- Study style preference: {study_style}
+
+Split the available time into exactly {hours} ONE-HOUR sessions.
+Tasks may repeat. Put higher-importance or harder tasks first.
+Do NOT include clock times.
+
+Study style rules for "focus":
+- Pomodoro: two 25-minute focus sessions with short breaks.
+- Deep Work: uninterrupted focused work.
+- Short Sessions: lighter review-focused study.
+
+Return ONLY a JSON object of this shape:
+{{
+  "sessions": [
+    {{"task": "<task name>", "focus": "<how the hour is used>", "notes": "<practical guidance>"}}
+  ],
+  "motivation": "<one short motivational message>"
+}}
+"""
+
+
 # ------------------------------------------------------------
 # EXTRACT FIRST (NEXT) TASK FROM STUDY PLAN
 # ------------------------------------------------------------
@@ -56,6 +88,13 @@ Give me one short motivational study quote under 15 words.
 Keep it encouraging, simple, and inspiring.
 """
 
+# Batch variant used by the quote pool: one request, many quotes.
+QUOTE_BATCH_PROMPT = """
+Give me {count} different short motivational study quotes, each under 15 words.
+Keep them encouraging, simple, and inspiring.
+Return one quote per line with no numbering, bullets or extra text.
+"""
+
 
 # ------------------------------------------------------------
 # QUICK INSIGHTS FROM HABIT LOG PROMPT
@@ -63,8 +102,8 @@ Keep it encouraging, simple, and inspiring.
 QUICK_INSIGHTS_PROMPT = """
 You are an AI analysing a student's study habit logs.
 
-Here are the logs:
-{logs}
+Here is a summary of their study logs:
+{summary}
 
 Based on the data, provide EXACTLY three short insights about:
 - productivity patterns
@@ -82,8 +121,8 @@ Make each insight one concise bullet point.
 WEEKLY_SUMMARY_PROMPT = """
 You are an AI study coach summarising a student's weekly performance.
 
-Habit logs for the week:
-{logs}
+Summary of this week's study logs:
+{summary}
 
 Write a clear weekly summary that includes:
 1. Total hours studied this week
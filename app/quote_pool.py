@@ -0,0 +1,69 @@
+"""
+In-memory pool of motivational quotes.
+
+Quotes are fetched in batches (one LLM request per batch) and served
+without blocking. When the pool drops below its low-water mark a
+background thread fetches the next batch; until it arrives, already
+served quotes are rotated.
+"""
+from collections import deque
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class QuotePool:
+    def __init__(self, fetch_batch, batch_size=10, low_water=3,
+                 fallback="Stay consistent"):
+        self.fetch_batch = fetch_batch  # callable(count) -> list of quotes
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.fallback = fallback
+
+        self._fresh = deque()
+        self._served = deque(maxlen=batch_size)
+        self._lock = threading.Lock()
+        self._refilling = False
+
+    def next_quote(self):
+        """Returns a quote immediately; never waits on the LLM."""
+        with self._lock:
+            if self._fresh:
+                quote = self._fresh.popleft()
+                self._served.append(quote)
+            elif self._served:
+                quote = self._served[0]
+                self._served.rotate(-1)
+            else:
+                quote = self.fallback
+
+            low = len(self._fresh) < self.low_water
+
+        if low:
+            self.refill_async()
+        return quote
+
+    def refill_async(self):
+        """Starts one background refill unless one is already running."""
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+
+        threading.Thread(target=self._refill, daemon=True).start()
+
+    def _refill(self):
+        try:
+            quotes = self.fetch_batch(self.batch_size)
+        except Exception as e:
+            logger.warning("Quote pool refill failed: %s", e)
+            quotes = []
+
+        with self._lock:
+            self._fresh.extend(q for q in quotes if q)
+            self._refilling = False
+
+    def size(self):
+        with self._lock:
+            return len(self._fresh)
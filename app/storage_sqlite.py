@@ -0,0 +1,317 @@
+"""
+Optional SQLite storage for plans, sessions, deadlines and habit logs.
+
+Enabled with SENSEFLOW_STORAGE=sqlite; backend.load_study_plan /
+save_study_plan / load_habit_data / save_habit_data then read and write
+here instead of the JSON files. The database runs in WAL mode so readers
+never block the writer.
+
+Migrate existing JSON data with:
+
+    python storage_sqlite.py migrate
+"""
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plan (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    plan_text TEXT,
+    next_session INTEGER,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id INTEGER PRIMARY KEY,
+    task TEXT NOT NULL,
+    duration_hours REAL NOT NULL DEFAULT 1,
+    focus TEXT,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_task ON sessions (task);
+CREATE TABLE IF NOT EXISTS completions (
+    session_id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deadlines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deadlines_date ON deadlines (date);
+CREATE TABLE IF NOT EXISTS habit_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT,
+    task TEXT,
+    hours REAL NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_habit_date ON habit_entries (date);
+CREATE INDEX IF NOT EXISTS idx_habit_task_date ON habit_entries (task, date);
+"""
+
+# Plan keys with their own tables/columns; anything else goes in plan.extra
+_PLAN_COLUMNS = {"plan", "sessions", "deadlines", "completed_sessions", "next_session"}
+_HABIT_COLUMNS = {"date", "task", "hours"}
+
+# Per-user databases: each thread keeps its most recently used connections
+# open and closes the rest, so file descriptors stay bounded
+MAX_CONNECTIONS_PER_THREAD = int(os.getenv("SENSEFLOW_DB_CONNECTIONS", "8"))
+
+_local = threading.local()
+
+
+def _open(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def connect(db_path):
+    """Returns this thread's connection to db_path, creating the schema."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = OrderedDict()
+
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = _open(db_path)
+        while len(conns) > MAX_CONNECTIONS_PER_THREAD:
+            _, evicted = conns.popitem(last=False)
+            evicted.close()
+    else:
+        conns.move_to_end(db_path)
+    return conn
+
+
+# ------------------------------------------------------------
+# PLANS
+# ------------------------------------------------------------
+def load_plan(conn):
+    row = conn.execute("SELECT plan_text, next_session, extra FROM plan WHERE id = 1").fetchone()
+    if row is None:
+        return None
+
+    plan = json.loads(row["extra"] or "{}")
+    plan["plan"] = row["plan_text"]
+    plan["sessions"] = [
+        dict(s) for s in conn.execute(
+            "SELECT session_id, task, duration_hours, focus, notes "
+            "FROM sessions ORDER BY session_id"
+        )
+    ]
+    plan["deadlines"] = [
+        dict(d) for d in conn.execute("SELECT name, date FROM deadlines ORDER BY id")
+    ]
+    plan["completed_sessions"] = [
+        r["session_id"] for r in conn.execute(
+            "SELECT session_id FROM completions ORDER BY position"
+        )
+    ]
+    plan["next_session"] = row["next_session"]
+    return plan
+
+
+def save_plan(conn, plan):
+    """Replaces the stored plan in a single transaction."""
+    extra = {k: v for k, v in plan.items() if k not in _PLAN_COLUMNS}
+
+    with conn:
+        conn.execute("DELETE FROM sessions")
+        conn.execute("DELETE FROM completions")
+        conn.execute("DELETE FROM deadlines")
+        conn.execute(
+            "INSERT OR REPLACE INTO plan (id, plan_text, next_session, extra) VALUES (1, ?, ?, ?)",
+            (plan.get("plan"), plan.get("next_session"), json.dumps(extra))
+        )
+        conn.executemany(
+            "INSERT INTO sessions (session_id, task, duration_hours, focus, notes) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (s["session_id"], s["task"], s.get("duration_hours", 1),
+                 s.get("focus"), s.get("notes"))
+                for s in plan.get("sessions", [])
+            ]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO completions (session_id, position) VALUES (?, ?)",
+            [(sid, i) for i, sid in enumerate(plan.get("completed_sessions", []))]
+        )
+        conn.executemany(
+            "INSERT INTO deadlines (name, date) VALUES (?, ?)",
+            [(d.get("name", "Deadline"), d["date"]) for d in plan.get("deadlines", [])]
+        )
+
+
+# ------------------------------------------------------------
+# HABIT LOG
+# ------------------------------------------------------------
+def _row_to_habit(row):
+    log = json.loads(row["extra"]) if row["extra"] else {}
+    log.update({"date": row["date"], "task": row["task"], "hours": row["hours"]})
+    return log
+
+
+def iter_habits(conn):
+    for row in conn.execute("SELECT date, task, hours, extra FROM habit_entries ORDER BY id"):
+        yield _row_to_habit(row)
+
+
+def habits_between(conn, start, end, task=None):
+    """Entries with start <= date <= end (ISO strings), optionally for one task."""
+    sql = "SELECT date, task, hours, extra FROM habit_entries WHERE date BETWEEN ? AND ?"
+    params = [start, end]
+    if task is not None:
+        sql += " AND task = ?"
+        params.append(task)
+    for row in conn.execute(sql + " ORDER BY date, id", params):
+        yield _row_to_habit(row)
+
+
+def _habit_row(log):
+    extra = {k: v for k, v in log.items() if k not in _HABIT_COLUMNS}
+    return (log.get("date"), log.get("task"), log.get("hours", 0) or 0,
+            json.dumps(extra) if extra else None)
+
+
+def append_habit(conn, log):
+    with conn:
+        conn.execute(
+            "INSERT INTO habit_entries (date, task, hours, extra) VALUES (?, ?, ?, ?)",
+            _habit_row(log)
+        )
+
+
+def habit_stats(conn):
+    """Same shape as backend's habit_stats.json, computed with indexed GROUP BYs."""
+    total = conn.execute("SELECT COALESCE(SUM(hours), 0) FROM habit_entries").fetchone()[0]
+    task_hours = {
+        r[0]: r[1] for r in conn.execute(
+            "SELECT task, SUM(hours) FROM habit_entries "
+            "WHERE task IS NOT NULL AND task != '' GROUP BY task"
+        )
+    }
+    daily_hours = {
+        r[0]: r[1] for r in conn.execute(
+            "SELECT date, SUM(hours) FROM habit_entries "
+            "WHERE date IS NOT NULL AND date != '' GROUP BY date ORDER BY date"
+        )
+    }
+    return {
+        "total_hours": round(total, 4),
+        "task_hours": {k: round(v, 4) for k, v in task_hours.items()},
+        "daily_hours": {k: round(v, 4) for k, v in daily_hours.items()},
+    }
+
+
+def task_hours_between(conn, task, start, end):
+    """e.g. "hours for task X last week" without loading the log."""
+    row = conn.execute(
+        "SELECT COALESCE(SUM(hours), 0) FROM habit_entries "
+        "WHERE task = ? AND date BETWEEN ? AND ?",
+        (task, start, end)
+    ).fetchone()
+    return row[0]
+
+
+# ------------------------------------------------------------
+# MIGRATION
+# ------------------------------------------------------------
+def _read_habit_file(path):
+    """Entries of a JSONL or legacy JSON-array log; torn JSONL lines are skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        if not path.endswith(".jsonl"):
+            return json.load(f)
+        entries = []
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return entries
+
+
+def migrate_from_json(db_path, plan_path, habit_paths):
+    """
+    Copies the JSON plan and habit log(s) into an empty database.
+    habit_paths may be JSONL or legacy JSON-array files.
+    The data is written to a temporary database that replaces db_path
+    only once everything was copied, so a failure leaves no half-seeded
+    database behind. Returns (plan_migrated, habit_entries_migrated).
+    """
+    if os.path.exists(db_path):
+        conn = connect(db_path)
+        if conn.execute("SELECT COUNT(*) FROM plan").fetchone()[0] or \
+                conn.execute("SELECT COUNT(*) FROM habit_entries").fetchone()[0]:
+            raise RuntimeError(f"{db_path} already has data; refusing to migrate over it")
+
+    tmp_path = f"{db_path}.{os.getpid()}.migrating"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(tmp_path + suffix):
+            os.remove(tmp_path + suffix)
+
+    conn = _open(tmp_path)
+    try:
+        plan_migrated = False
+        if os.path.exists(plan_path):
+            with open(plan_path, "r") as f:
+                save_plan(conn, json.load(f))
+            plan_migrated = True
+
+        count = 0
+        for path in habit_paths:
+            if not os.path.exists(path):
+                continue
+            rows = [_habit_row(log) for log in _read_habit_file(path)]
+            with conn:
+                conn.executemany(
+                    "INSERT INTO habit_entries (date, task, hours, extra) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+            count += len(rows)
+            break  # JSONL wins over the legacy array when both exist
+
+        # Fold the WAL back in so the single file can be moved into place
+        conn.execute("PRAGMA journal_mode=DELETE")
+    except BaseException:
+        conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(tmp_path + suffix):
+                os.remove(tmp_path + suffix)
+        raise
+    conn.close()
+
+    conns = getattr(_local, "conns", {})
+    stale = conns.pop(db_path, None)
+    if stale is not None:
+        stale.close()
+    os.replace(tmp_path, db_path)
+    return plan_migrated, count
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("usage: python storage_sqlite.py migrate")
+        sys.exit(2)
+
+    import backend
+
+    plan_done, entries = migrate_from_json(
+        backend.DB_PATH,
+        backend.PLAN_PATH,
+        [backend.HABIT_LOG_PATH, backend.LEGACY_HABIT_LOG_PATH]
+    )
+    print(f"Migrated plan: {plan_done}, habit entries: {entries} -> {backend.DB_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Offline OpenAI-compatible stand-in server for benchmarks and load tests.
+
+Serves POST /v1/chat/completions (plain and streamed) with canned replies
+and configurable latency, so the app can run without the live API:
+
+    python stub_server.py --port 8765 --latency 0.3 --token-delay 0.01
+    LLM_BACKEND=stub LLM_STUB_URL=http://127.0.0.1:8765/v1 python app.py
+
+Canned replies can be supplied as a JSON list of
+{"match": "<substring of the prompt>", "response": "<text>"}; the first
+match wins. Without a match a built-in reply for each app prompt is used.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+
+# ------------------------------------------------------------
+# BUILT-IN REPLIES
+# ------------------------------------------------------------
+def _plan_hours(prompt, pattern):
+    match = re.search(pattern, prompt)
+    try:
+        return max(1, int(float(match.group(1)))) if match else 2
+    except ValueError:
+        return 2
+
+
+def _tasks(prompt):
+    match = re.search(r"Tasks to complete: (.*?)\n- Available", prompt, re.S)
+    tasks = [t.strip() for t in match.group(1).splitlines() if t.strip()] if match else []
+    return tasks or ["Study"]
+
+
+def builtin_reply(prompt):
+    if "Return ONLY a JSON object" in prompt:
+        hours = _plan_hours(prompt, r"exactly (\d+) ONE-HOUR")
+        tasks = _tasks(prompt)
+        return json.dumps({
+            "sessions": [
+                {
+                    "task": tasks[i % len(tasks)],
+                    "focus": "25 minutes focus\nShort break\n25 minutes focus",
+                    "notes": f"Work through the key points of {tasks[i % len(tasks)]}."
+                }
+                for i in range(hours)
+            ],
+            "motivation": "Every hour you put in today counts."
+        })
+
+    if "study plan" in prompt.lower():
+        hours = _plan_hours(prompt, r"Available study time: ([\d.]+) hours")
+        tasks = _tasks(prompt)
+        blocks = []
+        for i in range(hours):
+            task = tasks[i % len(tasks)]
+            blocks.append(
+                f"### Study Hour {i + 1}: {task}\n"
+                f"- **Duration:** 1 hour\n"
+                f"Focus:\n25 minutes focus on {task}\nShort break\n25 minutes practice\n"
+                f"Notes:\n"
+                f"- **Notes:** Summarise the main ideas of {task}.\n\n---"
+            )
+        return "\n".join(blocks) + "\n**Motivational message:** Keep going, you are doing great!"
+
+    count_match = re.search(r"Give me (\d+) different", prompt)
+    if count_match:
+        count = int(count_match.group(1))
+        return "\n".join(f"Small steps every day build big results ({i + 1})." for i in range(count))
+
+    if "quote" in prompt.lower():
+        return "Small steps every day build big results."
+
+    if "weekly summary" in prompt.lower():
+        return (
+            "**Weekly summary**\n\n"
+            "- Total hours: see table\n- Best day: your most productive day\n"
+            "- Recommendation: keep a steady daily routine."
+        )
+
+    return "- You study most consistently early in the week.\n- Sessions are getting longer.\n- Try to avoid gaps on weekends."
+
+
+# ------------------------------------------------------------
+# SERVER
+# ------------------------------------------------------------
+class StubConfig:
+    def __init__(self, latency=0.0, jitter=0.0, token_delay=0.0,
+                 error_rate=0.0, canned=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.canned = canned or []
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def reply_for(self, prompt):
+        for rule in self.canned:
+            if rule.get("match", "") in prompt:
+                return rule["response"]
+        return builtin_reply(prompt)
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0
+        return self.latency + extra
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+
+def _approx_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+            model = request.get("model", "stub")
+
+            time.sleep(config.delay())
+            if config.should_fail():
+                self._send_json(503, {"error": {"message": "stub: injected failure"}})
+                return
+
+            text = config.reply_for(prompt)
+            created = int(time.time())
+            usage = {
+                "prompt_tokens": _approx_tokens(prompt),
+                "completion_tokens": _approx_tokens(text),
+                "total_tokens": _approx_tokens(prompt) + _approx_tokens(text)
+            }
+
+            if not request.get("stream"):
+                self._send_json(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": usage
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                delta = word if i == 0 else " " + word
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if config.token_delay:
+                    time.sleep(config.token_delay)
+
+            if (request.get("stream_options") or {}).get("include_usage"):
+                # Like the real API: a last chunk with no choices, just usage
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def start_server(host="127.0.0.1", port=8765, config=None):
+    """Starts the stub in a background thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), make_handler(config or StubConfig()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before replying")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, seconds")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--responses", help="JSON file of canned replies")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    canned = []
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            canned = json.load(f)
+
+    config = StubConfig(args.latency, args.jitter, args.token_delay,
+                        args.error_rate, canned, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Stub LLM server on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
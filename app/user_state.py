@@ -0,0 +1,143 @@
+"""
+Per-user partitioning of app state.
+
+Backend paths depend on the user of the current request. Gradio handlers
+are wrapped with per_user(), which reads the gr.Request and runs the
+handler inside user_scope(); code outside any scope (scripts, notebooks)
+uses the original single-user files.
+
+Each browser gets its own directory, DATA_DIR/users/<id>/. The id is the
+logged-in username when auth is on (demo.launch(auth=...)), otherwise a
+random id kept in the BROWSER_COOKIE cookie, which BROWSER_ID_HEAD (added
+to the page <head>) creates on the first visit. Gradio's session hash is
+not used: it changes on every page load, so the history would vanish
+after each reload. Requests without either id use the shared files.
+
+Existing single-user data is not moved automatically. To give it to a
+user, copy current_plan.json, habit_log.jsonl (or habit_log.json)
+and calendar/ into that user's directory, e.g. with adopt_shared_data().
+"""
+from contextlib import contextmanager
+import contextvars
+import functools
+import hashlib
+import inspect
+import os
+import re
+import shutil
+
+_current_user = contextvars.ContextVar("senseflow_user", default=None)
+
+BROWSER_COOKIE = "senseflow_browser"
+
+# Sets a long-lived random browser id before the app's first request
+BROWSER_ID_HEAD = """<script>
+(() => {
+  if (document.cookie.split("; ").some(c => c.startsWith("%(cookie)s="))) return;
+  const id = (window.crypto && crypto.randomUUID) ? crypto.randomUUID()
+    : Date.now().toString(36) + Math.random().toString(36).slice(2);
+  document.cookie = "%(cookie)s=" + id + "; path=/; max-age=31536000; SameSite=Lax";
+})();
+</script>""" % {"cookie": BROWSER_COOKIE}
+
+
+def safe_user_id(user_id):
+    """Filesystem-safe, collision-free directory name for a user id."""
+    user_id = str(user_id)
+    clean = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)[:40]
+    digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:8]
+    return f"{clean}-{digest}"
+
+
+def current_user():
+    return _current_user.get()
+
+
+@contextmanager
+def user_scope(user_id):
+    token = _current_user.set(safe_user_id(user_id) if user_id else None)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def user_id_for(request):
+    """
+    Logged-in username when auth is on, otherwise "browser-<id>" from the
+    browser id cookie; None (shared files) if the request has neither.
+    """
+    if request is None:
+        return None
+    username = getattr(request, "username", None)
+    if username:
+        return username
+    cookies = getattr(request, "cookies", None) or {}
+    browser_id = cookies.get(BROWSER_COOKIE)
+    if browser_id and re.fullmatch(r"[A-Za-z0-9-]{8,64}", browser_id):
+        return f"browser-{browser_id}"
+    return None
+
+
+SHARED_FILES = ["current_plan.json", "habit_log.jsonl", "habit_log.json", "calendar"]
+
+
+def adopt_shared_data(user_id, data_dir, base_dir):
+    """
+    Copies the single-user files in base_dir into user_id's directory
+    under data_dir. Files the user already has are left alone.
+    Returns the names that were copied.
+    """
+    user_dir = os.path.join(data_dir, "users", safe_user_id(user_id))
+    os.makedirs(user_dir, exist_ok=True)
+    copied = []
+    for name in SHARED_FILES:
+        src, dst = os.path.join(base_dir, name), os.path.join(user_dir, name)
+        if not os.path.exists(src) or os.path.exists(dst):
+            continue
+        if os.path.isdir(src):
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy2(src, dst)
+        copied.append(name)
+    return copied
+
+
+def per_user(fn):
+    """
+    Wraps a Gradio handler so it runs in the caller's user scope.
+    The wrapper declares an extra `request: gr.Request` parameter, which
+    Gradio fills in after the handler's own inputs.
+    Generator handlers get the scope around every step.
+    """
+    import gradio as gr
+
+    sig = inspect.signature(fn)
+    params = list(sig.parameters.values())
+    request_param = inspect.Parameter(
+        "request", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=gr.Request
+    )
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            *call_args, request = args
+            uid = user_id_for(request)
+            steps = fn(*call_args)
+            while True:
+                with user_scope(uid):
+                    try:
+                        item = next(steps)
+                    except StopIteration:
+                        return
+                yield item
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args):
+            *call_args, request = args
+            with user_scope(user_id_for(request)):
+                return fn(*call_args)
+
+    wrapper.__signature__ = sig.replace(parameters=params + [request_param])
+    wrapper.__annotations__ = {**getattr(fn, "__annotations__", {}), "request": gr.Request}
+    return wrapper